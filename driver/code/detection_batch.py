@@ -0,0 +1,101 @@
+import logging
+
+import numpy as np
+
+# One row per detected object, box corners in pixels
+DETECTION_DTYPE = np.dtype([('label_id', '<i4'),
+                            ('score', '<f4'),
+                            ('x1', '<f4'),
+                            ('y1', '<f4'),
+                            ('x2', '<f4'),
+                            ('y2', '<f4')])
+
+
+class DetectedObject(object):
+    """Single detection with the attributes of EdgeTPU results (label_id, score, bounding_box)"""
+    __slots__ = ('label_id', 'score', 'bounding_box')
+
+    def __init__(self, label_id, score, bounding_box):
+        self.label_id = label_id
+        self.score = score
+        self.bounding_box = bounding_box  # [(x1,y1), (x2,y2)]
+
+
+class DetectionBatch(object):
+    """
+    All detections of one frame in a structured numpy array
+    Filtering and closeness checks run over the whole batch at once
+    """
+
+    def __init__(self, rows=None):
+        self.rows = np.zeros((0,), dtype=DETECTION_DTYPE) if rows is None else rows
+
+    @staticmethod
+    def from_objects(objects):
+        """Batch from objects with label_id, score and bounding_box [(x1,y1), (x2,y2)]"""
+        rows = np.zeros((len(objects),), dtype=DETECTION_DTYPE)
+        for i, obj in enumerate(objects):
+            (x1, y1), (x2, y2) = obj.bounding_box
+            rows[i] = (obj.label_id, obj.score, x1, y1, x2, y2)
+        return DetectionBatch(rows)
+
+    @staticmethod
+    def from_arrays(label_ids, scores, boxes):
+        """Batch from detector output arrays, boxes are (N, 4) x1, y1, x2, y2 in pixels"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        rows = np.zeros((len(boxes),), dtype=DETECTION_DTYPE)
+        rows['label_id'] = label_ids
+        rows['score'] = scores
+        rows['x1'], rows['y1'], rows['x2'], rows['y2'] = boxes.T
+        return DetectionBatch(rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def label_ids(self):
+        return self.rows['label_id']
+
+    @property
+    def scores(self):
+        return self.rows['score']
+
+    @property
+    def boxes(self):
+        """(N, 4) x1, y1, x2, y2"""
+        return np.stack([self.rows['x1'], self.rows['y1'], self.rows['x2'], self.rows['y2']], axis=1)
+
+    @property
+    def heights(self):
+        return self.rows['y2'] - self.rows['y1']
+
+    def select(self, mask):
+        return DetectionBatch(self.rows[mask])
+
+    def filter_confidence(self, min_confidence):
+        return self.select(self.rows['score'] >= min_confidence)
+
+    def close_by(self, frame_height, min_height_pct=0.05):
+        """Mask of detections tall enough to act on, same rule as TrafficObject.is_close_by
+        min_height_pct -- one value, or an array indexed by label_id
+        """
+        min_height_pct = np.asarray(min_height_pct, dtype=np.float32)
+        if min_height_pct.ndim:
+            min_height_pct = min_height_pct[self.rows['label_id']]
+        return self.heights / float(frame_height) >= min_height_pct
+
+    def label_set(self, mask=None):
+        """Sorted unique label ids, optionally of the masked detections"""
+        label_ids = self.rows['label_id'] if mask is None else self.rows['label_id'][mask]
+        return np.unique(label_ids)
+
+    def objects(self):
+        """Rows as DetectedObject, for code that draws or logs single detections"""
+        return [DetectedObject(int(r['label_id']), float(r['score']),
+                               [(float(r['x1']), float(r['y1'])), (float(r['x2']), float(r['y2']))])
+                for r in self.rows]
+
+    def log(self, labels):
+        for r in self.rows:
+            logging.debug("%s, %.0f%% w=%.0f h=%.0f" % (labels.get(int(r['label_id']), r['label_id']), r['score'] * 100,
+                                                       r['x2'] - r['x1'], r['y2'] - r['y1']))
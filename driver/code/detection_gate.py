@@ -0,0 +1,141 @@
+import collections
+import logging
+import time
+
+import cv2
+import numpy as np
+
+# Why a frame went to the detector, or did not
+FIRST = 'first'
+NOVEL = 'novel'
+REFRESH_FRAMES = 'refresh_frames'
+REFRESH_TIME = 'refresh_time'
+SKIPPED = 'skipped'
+
+
+class DetectionGate(object):
+    """
+    Decides per frame whether the object detector has to run
+    The frame is shrunk to a small gray thumbnail and compared with the thumbnail of
+    the last detected frame. The novelty score is the share of thumbnail pixels that
+    changed by more than pixel_threshold gray levels. A frame is detected when the
+    score reaches novelty_threshold, and in any case every refresh_frames frames and
+    every refresh_sec seconds, so a slow change (a light turning red) is never missed
+    for longer than that.
+    """
+
+    def __init__(self, novelty_threshold=0.01, pixel_threshold=16, size=(64, 48), refresh_frames=15,
+                 refresh_sec=1.0):
+        self.novelty_threshold = novelty_threshold
+        self.pixel_threshold = pixel_threshold
+        self.size = size
+        self.refresh_frames = refresh_frames
+        self.refresh_sec = refresh_sec
+
+        self.gray = np.empty((size[1], size[0]), dtype=np.uint8)
+        self.reference = None
+        self.reference_time = 0
+        self.frames_since_detection = 0
+        self.last_score = 0.0
+
+        # metrics
+        self.start_time = None
+        self.frames = 0
+        self.detections = 0
+        self.decisions = collections.Counter()
+        self.score_sum = 0.0
+
+    def novelty(self, frame):
+        """Share of changed thumbnail pixels since the last detected frame, 1.0 without one"""
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        else:
+            np.copyto(self.gray, small)
+        if self.reference is None:
+            return 1.0
+        diff = cv2.absdiff(self.gray, self.reference)
+        return np.count_nonzero(diff > self.pixel_threshold) / float(diff.size)
+
+    def should_detect(self, frame, now=None):
+        if now is None:
+            now = time.time()
+        if self.start_time is None:
+            self.start_time = now
+        score = self.novelty(frame)
+        self.frames_since_detection += 1
+
+        if self.reference is None:
+            reason = FIRST
+        elif score >= self.novelty_threshold:
+            reason = NOVEL
+        elif self.frames_since_detection >= self.refresh_frames:
+            reason = REFRESH_FRAMES
+        elif now - self.reference_time >= self.refresh_sec:
+            reason = REFRESH_TIME
+        else:
+            reason = SKIPPED
+
+        self.frames += 1
+        self.score_sum += score
+        self.last_score = score
+        self.decisions[reason] += 1
+        if reason == SKIPPED:
+            return False
+        logging.debug('Detect frame, %s (novelty %.3f)' % (reason, score))
+        self.detections += 1
+        self.reference = self.gray.copy()
+        self.reference_time = now
+        self.frames_since_detection = 0
+        return True
+
+    def metrics(self, now=None):
+        """Detector invocation rate and gating decisions since the first frame"""
+        if now is None:
+            now = time.time()
+        elapsed = now - self.start_time if self.start_time is not None else 0
+        return {'frames': self.frames,
+                'detections': self.detections,
+                'detection_ratio': self.detections / float(self.frames) if self.frames else 0.0,
+                'detections_per_sec': self.detections / elapsed if elapsed > 0 else 0.0,
+                'mean_novelty': self.score_sum / self.frames if self.frames else 0.0,
+                'decisions': dict(self.decisions)}
+
+    def log_metrics(self, now=None):
+        m = self.metrics(now)
+        logging.info('Detection gate: %d of %d frames detected (%.0f%%, %.1f/s), mean novelty %.3f, %s'
+                     % (m['detections'], m['frames'], m['detection_ratio'] * 100, m['detections_per_sec'],
+                        m['mean_novelty'], ', '.join('%s %d' % kv for kv in sorted(m['decisions'].items()))))
+
+
+############################
+# Test Functions
+############################
+def test_drive(camera_fps=20, seconds=6.0):
+    """Synthetic drive: empty road, then a stop sign drives into view, then empty road again"""
+    gate = DetectionGate()
+    rng = np.random.RandomState(0)
+    road = np.full((480, 640, 3), 90, dtype=np.uint8)
+    road[300:] = 60
+    frames = int(camera_fps * seconds)
+    detected = []
+    gate_sec = 0
+    for i in range(frames):
+        frame = road.copy()
+        frame += rng.randint(0, 6, frame.shape).astype(np.uint8)  # sensor noise
+        if frames // 3 <= i < 2 * frames // 3:
+            size = 20 + (i - frames // 3) * 3
+            cv2.rectangle(frame, (400, 100), (400 + size, 100 + size), (0, 0, 200), -1)
+        start_time = time.time()
+        detected.append(gate.should_detect(frame, now=i / float(camera_fps)))
+        gate_sec += time.time() - start_time
+    thirds = np.array_split(np.array(detected), 3)
+    print('Detected frames: empty road %d/%d, sign approaching %d/%d, empty road %d/%d; gate %.2f ms/frame'
+          % (thirds[0].sum(), len(thirds[0]), thirds[1].sum(), len(thirds[1]), thirds[2].sum(), len(thirds[2]),
+             gate_sec / frames * 1000))
+    gate.log_metrics(now=frames / float(camera_fps))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(levelname)-5s: %(message)s')
+    test_drive()
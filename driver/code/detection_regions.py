@@ -0,0 +1,158 @@
+import logging
+import time
+
+import numpy as np
+
+from detection_batch import DetectionBatch
+from object_tracker import iou_matrix
+
+# Detection modes
+FULL = 'full'  # whole frame into the detector input, as before
+CROP = 'crop'  # one region of the frame
+TILE = 'tile'  # region cut into overlapping tiles of about the detector input size
+
+# Relative x1, y1, x2, y2 of the band signs and traffic lights are seen in;
+# the lower part of the frame is road surface
+SIGN_BAND = (0.0, 0.0, 1.0, 0.6)
+
+
+def region_rect(frame_width, frame_height, region=SIGN_BAND):
+    """(1, 4) pixel x1, y1, x2, y2 of a relative region"""
+    scale = np.array([frame_width, frame_height, frame_width, frame_height], dtype=np.float32)
+    rect = np.round(np.asarray(region, dtype=np.float32) * scale).astype(np.int32)
+    rect[[0, 2]] = np.clip(rect[[0, 2]], 0, frame_width)
+    rect[[1, 3]] = np.clip(rect[[1, 3]], 0, frame_height)
+    return rect.reshape(1, 4)
+
+
+def tile_rects(rect, tile_width, tile_height, overlap=0.2):
+    """(N, 4) pixel x1, y1, x2, y2 of tiles covering rect; neighbours overlap by at least `overlap` of a tile"""
+    x1, y1, x2, y2 = np.asarray(rect).reshape(4)
+
+    def starts(begin, end, size):
+        if end - begin <= size:
+            return np.array([begin]), end - begin
+        count = int(np.ceil((end - begin - size * overlap) / (size * (1 - overlap))))
+        return np.round(np.linspace(begin, end - size, count)).astype(np.int32), size
+
+    xs, width = starts(x1, x2, tile_width)
+    ys, height = starts(y1, y2, tile_height)
+    left, top = [a.reshape(-1) for a in np.meshgrid(xs, ys)]
+    return np.stack([left, top, left + width, top + height], axis=1).astype(np.int32)
+
+
+def map_boxes(boxes, rect_index, rects):
+    """Boxes relative to their region (0..1) -> frame pixels, rect_index gives the region of every box"""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    rects = np.asarray(rects, dtype=np.float32)[rect_index]
+    size = np.tile(rects[:, 2:] - rects[:, :2], 2)
+    return rects[:, [0, 1, 0, 1]] + boxes * size
+
+
+def nms(batch, iou_threshold=0.5, contain_threshold=0.8):
+    """
+    Greedy per-label non maximum suppression
+    A box is dropped when a better box of the same label overlaps it by iou_threshold,
+    or covers contain_threshold of its area: a sign cut by a tile border is seen twice,
+    once whole and once in part.
+    """
+    if len(batch) < 2:
+        return batch
+    boxes = batch.boxes
+    iou = iou_matrix(boxes, boxes)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    # iou = i / (a + b - i)  =>  i = iou * (a + b) / (1 + iou)
+    intersection = iou * (area[:, None] + area[None, :]) / (1 + iou)
+    contained = intersection / np.maximum(area[None, :], 1e-6)  # [i, j]: share of box j inside box i
+    same_label = batch.label_ids[:, None] == batch.label_ids[None, :]
+    suppresses = same_label & ((iou >= iou_threshold) | (contained >= contain_threshold))
+
+    order = np.argsort(-batch.scores, kind='stable')
+    suppressed = np.zeros(len(batch), dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= suppresses[i]
+    return batch.select(np.sort(np.asarray(keep)))
+
+
+class DetectionRegions(object):
+    """
+    Where in the frame to run the detector
+    rects() gives the pixel regions to crop, each resized into the detector input;
+    merge() maps their detections back to the frame and removes duplicates across tiles.
+    """
+
+    def __init__(self, mode=FULL, region=SIGN_BAND, tile_size=(300, 300), overlap=0.2, iou_threshold=0.5):
+        if mode not in (FULL, CROP, TILE):
+            raise ValueError('Unknown detection mode %s, expected one of %s' % (mode, (FULL, CROP, TILE)))
+        self.mode = mode
+        self.region = (0.0, 0.0, 1.0, 1.0) if mode == FULL else region
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.iou_threshold = iou_threshold
+        self.frame_size = None
+        self._rects = None
+
+    def rects(self, frame_width, frame_height):
+        """(N, 4) pixel regions of a frame size, computed once per size"""
+        if (frame_width, frame_height) != self.frame_size:
+            rect = region_rect(frame_width, frame_height, self.region)
+            if self.mode == TILE:
+                rect = tile_rects(rect, self.tile_size[0], self.tile_size[1], self.overlap)
+            self.frame_size = (frame_width, frame_height)
+            self._rects = rect
+            logging.info('Detection mode %s: %d region(s) %s' % (self.mode, len(rect), rect.tolist()))
+        return self._rects
+
+    def merge(self, region_results):
+        """
+        DetectionBatch in frame pixels
+        region_results -- per rect, (label_ids, scores, boxes) with boxes relative to the rect
+        """
+        counts = [len(scores) for _, scores, _ in region_results]
+        if sum(counts) == 0:
+            return DetectionBatch()
+        label_ids = np.concatenate([np.asarray(l, dtype=np.int32).reshape(-1) for l, _, _ in region_results])
+        scores = np.concatenate([np.asarray(s, dtype=np.float32).reshape(-1) for _, s, _ in region_results])
+        boxes = np.concatenate([np.asarray(b, dtype=np.float32).reshape(-1, 4) for _, _, b in region_results])
+        rect_index = np.repeat(np.arange(len(region_results)), counts)
+        batch = DetectionBatch.from_arrays(label_ids, scores, map_boxes(boxes, rect_index, self._rects))
+        if len(region_results) > 1:
+            batch = nms(batch, self.iou_threshold)
+        return batch
+
+
+############################
+# Test Functions
+############################
+def test_small_sign(input_size=(300, 300)):
+    """How many input pixels a distant 24x24 pixel sign gets in each mode, and the merge cost of tiling"""
+    width, height = 640, 480
+    sign = np.array([[400, 100, 424, 124]], dtype=np.float32)
+    for mode in (FULL, CROP, TILE):
+        regions = DetectionRegions(mode, tile_size=input_size)
+        rects = regions.rects(width, height)
+        inside = np.all((rects[:, :2] <= sign[:, :2]) & (rects[:, 2:] >= sign[:, 2:]), axis=1)
+        rect = rects[np.argmax(inside)]
+        scale = np.array(input_size, dtype=np.float32) / (rect[2:] - rect[:2])
+        side = (sign[0, 2:] - sign[0, :2]) * scale
+
+        # the sign as every region containing it reports it, relative to that region
+        rect_size = np.tile(rects[:, 2:] - rects[:, :2], 2).astype(np.float32)
+        relative = (sign - rects[:, [0, 1, 0, 1]]) / rect_size
+        region_results = [([5], [0.9 - 0.01 * i], relative[i:i + 1]) if inside[i] else ([], [], np.zeros((0, 4)))
+                          for i in range(len(rects))]
+        start_time = time.time()
+        for _ in range(1000):
+            batch = regions.merge(region_results)
+        merge_us = (time.time() - start_time) * 1000
+        print('%-4s: %d detector call(s) per frame, sign is %.0fx%.0f input pixels, merged to %d box %s in %.0f us'
+              % (mode, len(rects), side[0], side[1], len(batch), batch.boxes.round(1).tolist(), merge_us))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(levelname)-5s: %(message)s')
+    test_small_sign()
@@ -0,0 +1,173 @@
+import collections
+import logging
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from detection_batch import DETECTION_DTYPE, DetectedObject, DetectionBatch
+
+# frame_time: when the frame was submitted, results always refer to that frame
+DetectionResult = collections.namedtuple('DetectionResult', ['frame_time', 'frame_seq', 'batch'])
+
+
+class StubDetector(object):
+    """Detector for tests: fixed detections after a fixed delay"""
+
+    def __init__(self, objects=None, delay_sec=0.2):
+        self.batch = DetectionBatch.from_objects(objects or [])
+        self.delay_sec = delay_sec
+
+    def detect(self, frame):
+        time.sleep(self.delay_sec)
+        return self.batch
+
+
+def _worker(detector_factory, shm_name, frame_shape, lock, frame_ready, header, results, running):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        shared_frame = np.ndarray(frame_shape, dtype=np.uint8, buffer=shm.buf)
+        frame = np.empty(frame_shape, dtype=np.uint8)
+        detector = detector_factory()
+        while running.is_set():
+            if not frame_ready.wait(timeout=0.1):
+                continue
+            with lock:
+                np.copyto(frame, shared_frame)
+                frame_time, frame_seq = header[0], int(header[1])
+                frame_ready.clear()
+            batch = detector.detect(frame)
+            if not isinstance(batch, DetectionBatch):
+                batch = DetectionBatch.from_objects(batch)
+            _put_latest(results, (frame_time, frame_seq, batch.rows))
+    except Exception:
+        # the exit code tells the main process, poll() raises
+        logging.exception('Detection worker failed')
+        raise
+    finally:
+        shm.close()
+
+
+def _put_latest(results, item):
+    """Queue a result; when the consumer is behind, the oldest queued results make room"""
+    while True:
+        try:
+            results.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                dropped = results.get_nowait()
+                logging.debug('Detection result of frame %d dropped, consumer is behind' % dropped[1])
+            except queue.Empty:
+                pass
+
+
+class DetectionWorker(object):
+    """
+    Runs an object detector in its own process at its own pace
+    The latest camera frame is handed over through shared memory; submit() and
+    poll() never wait for the detector, so lane following keeps the camera rate.
+    detector_factory -- picklable callable returning an object with detect(frame),
+                        called inside the worker (EdgeTPU engines cannot be pickled)
+    """
+
+    def __init__(self, detector_factory, frame_shape=(480, 640, 3)):
+        self.frame_shape = tuple(frame_shape)
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.frame_shape)))
+        self.shared_frame = np.ndarray(self.frame_shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.lock = multiprocessing.Lock()
+        self.frame_ready = multiprocessing.Event()
+        self.header = multiprocessing.RawArray('d', 2)  # frame time, frame sequence number
+        self.results = multiprocessing.Queue(maxsize=4)
+        self.running = multiprocessing.Event()
+        self.running.set()
+        self.frame_seq = 0
+        self.submitted = 0
+        self.received = 0
+
+        self.process = multiprocessing.Process(target=_worker,
+                                               args=(detector_factory, self.shm.name, self.frame_shape, self.lock,
+                                                     self.frame_ready, self.header, self.results, self.running))
+        self.process.daemon = True
+        self.process.start()
+        logging.info('DetectionWorker started (pid %d)' % self.process.pid)
+
+    def submit(self, frame, now=None):
+        """Offer the latest frame; a frame the detector has not picked up yet is replaced"""
+        if now is None:
+            now = time.time()
+        if frame.shape != self.frame_shape:
+            raise ValueError('Frame shape %s, worker expects %s' % (frame.shape, self.frame_shape))
+        with self.lock:
+            np.copyto(self.shared_frame, frame)
+            self.frame_seq += 1
+            self.header[0] = now
+            self.header[1] = self.frame_seq
+            self.frame_ready.set()
+        self.submitted += 1
+        return self.frame_seq
+
+    def poll(self):
+        """
+        Newest DetectionResult published since the last poll, or None; never blocks
+        Raises RuntimeError once the worker process is gone, old tracks must not keep the car driving
+        """
+        latest = None
+        while True:
+            try:
+                frame_time, frame_seq, rows = self.results.get_nowait()
+            except queue.Empty:
+                break
+            latest = DetectionResult(frame_time, frame_seq, DetectionBatch(np.asarray(rows, dtype=DETECTION_DTYPE)))
+            self.received += 1
+        if latest is None and not self.process.is_alive():
+            raise RuntimeError('Detection worker (pid %d) died with exit code %s'
+                               % (self.process.pid, self.process.exitcode))
+        return latest
+
+    def close(self):
+        self.running.clear()
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _type, value, traceback):
+        self.close()
+
+
+############################
+# Test Functions
+############################
+def _stub_stop_sign_detector():
+    return StubDetector([DetectedObject(5, 0.94, [(180, 120), (280, 220)])], delay_sec=0.2)
+
+
+def test_worker_rate(seconds=3.0, camera_fps=30):
+    """Main loop at camera rate while a 5 fps stub detector runs in the worker"""
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    loops = 0
+    ages = []
+    with DetectionWorker(_stub_stop_sign_detector, frame.shape) as worker:
+        start_time = time.time()
+        while time.time() - start_time < seconds:
+            worker.submit(frame)
+            result = worker.poll()
+            if result is not None:
+                ages.append(time.time() - result.frame_time)
+            loops += 1
+            time.sleep(1.0 / camera_fps)  # lane following would run here
+        elapsed = time.time() - start_time
+    print('Main loop: %.1f fps, detections: %.1f fps, mean result age %.0f ms'
+          % (loops / elapsed, len(ages) / elapsed, 1000 * np.mean(ages) if ages else 0))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(levelname)-5s: %(message)s')
+    test_worker_rate()
@@ -40,6 +40,16 @@ class HandCodedLaneFollower(object):
 
         return curr_heading_image
 
+    def compute_steering(self, frame):
+        """ Steering only: no rendering and no wheel command
+            Returns (steering angle, number of lane lines)
+        """
+        lane_lines = detect_lane_lines(frame)
+        if len(lane_lines) > 0:
+            new_steering_angle = compute_steering_angle(frame, lane_lines)
+            self.curr_steering_angle = stabilize_steering_angle(self.curr_steering_angle, new_steering_angle, len(lane_lines))
+        return self.curr_steering_angle, len(lane_lines)
+
 
 ############################
 # Frame processing steps
@@ -64,6 +74,15 @@ def detect_lane(frame):
     return lane_lines, lane_lines_image
 
 
+def detect_lane_lines(frame):
+    """
+    Same as detect_lane, but only returns the lane lines without drawing the debug images
+    """
+    cropped_edges = region_of_interest(detect_edges(frame))
+    line_segments = detect_line_segments(cropped_edges)
+    return average_slope_intercept(frame, line_segments)
+
+
 def detect_edges(frame):
     # filter for blue lane lines
     hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
@@ -0,0 +1,18 @@
+import cv2
+import numpy as np
+
+_BIT_WEIGHTS = (1 << np.arange(64, dtype=np.uint64))[::-1]
+
+
+def dhash(image):
+    """64-bit difference hash of a BGR image: is each pixel brighter than its right neighbour, on a 9x8 thumbnail"""
+    gray = cv2.cvtColor(np.ascontiguousarray(image), cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).reshape(-1)
+    return np.uint64(np.sum(_BIT_WEIGHTS[bits]))
+
+
+def hamming_distance(a, b):
+    """Bit distance between one hash and an array of hashes"""
+    x = np.bitwise_xor(np.asarray(b, dtype=np.uint64), np.uint64(a))
+    return np.unpackbits(x.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
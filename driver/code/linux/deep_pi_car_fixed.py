@@ -58,6 +58,12 @@ except ImportError:
         logging.error("No end-to-end lane follower available!")
         EndToEndLaneFollower = None
 
+try:
+    from steering_arbiter import SteeringArbiter
+except ImportError:
+    logging.warning("Steering arbiter not available, using hand-coded lane follower only")
+    SteeringArbiter = None
+
 
 class DeepPiCar(object):
 
@@ -156,7 +162,8 @@ class DeepPiCar(object):
         if EndToEndLaneFollower:
             try:
                 self.end_to_end_lane_follower = EndToEndLaneFollower(self)
-                logging.info("End-to-end lane follower initialized")
+                logging.info("End-to-end lane follower initialized: %s"
+                             % self.end_to_end_lane_follower.latency_report())
             except Exception as e:
                 logging.error("End-to-end lane follower initialization failed: %s" % str(e))
                 self.end_to_end_lane_follower = None
@@ -164,6 +171,12 @@ class DeepPiCar(object):
             self.end_to_end_lane_follower = None
             logging.warning("No end-to-end lane follower available")
 
+        # Run both followers under a per-frame time budget and fuse their angles
+        self.steering_arbiter = None
+        if SteeringArbiter and self.lane_follower and self.end_to_end_lane_follower:
+            self.steering_arbiter = SteeringArbiter(self, self.lane_follower, self.end_to_end_lane_follower)
+            logging.info("Steering arbiter initialized")
+
     def setup_recording(self):
         """Setup video recording"""
         try:
@@ -190,7 +203,16 @@ class DeepPiCar(object):
         if self.lane_follower is None:
             logging.error("No lane follower available, cannot drive")
             return
-            
+
+        # wheels stay stopped until the steering path is warm
+        self.back_wheels.speed = 0
+        self.back_wheels.stop()
+        if not self.wait_for_warm_inference():
+            if self.steering_arbiter is not None:
+                self.steering_arbiter.close()
+                self.steering_arbiter = None
+            logging.warning("End-to-end inference did not warm up, driving with the hand-coded lane follower only")
+
         self.back_wheels.speed = speed
         self.back_wheels.forward()
         
@@ -205,8 +227,8 @@ class DeepPiCar(object):
                     break
                 
                 try:
-                    # Process frame with lane follower
-                    frame = self.lane_follower.follow_lane(frame)
+                    # Process frame with lane follower(s)
+                    frame = self.follow_lane(frame)
                     
                     # Record video if available
                     if self.video_writer:
@@ -239,6 +261,27 @@ class DeepPiCar(object):
         finally:
             self.cleanup()
 
+    def follow_lane(self, frame):
+        if self.steering_arbiter is not None:
+            return self.steering_arbiter.follow_lane(frame)
+        return self.lane_follower.follow_lane(frame)
+
+    def wait_for_warm_inference(self):
+        """Make sure model inference is warm before the wheels start"""
+        follower = getattr(self, 'end_to_end_lane_follower', None)
+        if follower is None:
+            return True
+
+        if not follower.is_warm:
+            logging.info("Warming up end-to-end lane follower before driving...")
+            follower.warm_up()
+
+        report = follower.latency_report()
+        if report['cold_latency_ms'] is not None:
+            logging.info("Inference latency: cold=%.1fms, warm=%.1fms"
+                         % (report['cold_latency_ms'], report['warm_latency_ms']))
+        return follower.is_warm
+
     def cleanup(self):
         """Cleanup resources"""
         logging.info("Stopping the car, resetting hardware.")
@@ -249,6 +292,9 @@ class DeepPiCar(object):
             self.front_wheels.turn(90)
         except Exception as e:
             logging.error("Error during hardware cleanup: %s" % str(e))
+
+        if getattr(self, 'steering_arbiter', None):
+            self.steering_arbiter.close()
         
         try:
             if self.camera:
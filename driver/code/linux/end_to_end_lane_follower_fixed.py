@@ -4,43 +4,48 @@ import logging
 import math
 import os
 import sys
+import time
 from keras.models import load_model
 from hand_coded_lane_follower_fixed import HandCodedLaneFollower
+from model_registry import get_model_registry, MODEL_SEARCH_PATHS
+
+# img_preprocess lives with the training code, so training and driving cannot drift apart
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'models', 'lane_navigation', 'code'))
+from lane_dataset import img_preprocess
 
 _SHOW_IMAGE = False
+_MODEL_FILENAME = 'lane_navigation.h5'
+_WARMUP_RUNS = 3  # ilk predict cagrisi graph tracing yuzunden cok yavas, surusten once isit
+_MODEL_INPUT_SHAPE = (66, 200, 3)  # Nvidia model input (height, width, channels)
 
 
 class EndToEndLaneFollower(object):
 
-    def __init__(self, car=None, model_path=None):
+    def __init__(self, car=None, model_path=None, warmup_runs=_WARMUP_RUNS):
         logging.info('Creating a EndToEndLaneFollower...')
         
-        # Linux path için model dosyasını bul - multiple locations check
+        # Linux path için model dosyasını bul - registry son bulunan yeri hatirlar
+        registry = get_model_registry()
         if model_path is None:
-            possible_paths = [
-                '/home/pi/DeepPiCar/models/lane_navigation/data/model_result/lane_navigation.h5',
-                os.path.join(os.path.dirname(__file__), '..', '..', '..', 'models', 'lane_navigation', 'data', 'model_result', 'lane_navigation.h5'),
-                './models/lane_navigation/data/model_result/lane_navigation.h5',
-                '../models/lane_navigation/data/model_result/lane_navigation.h5'
-            ]
-            
-            model_path = None
-            for path in possible_paths:
-                if os.path.exists(path):
-                    model_path = path
-                    logging.info('Found model at: %s' % path)
-                    break
+            model_path = registry.resolve(_MODEL_FILENAME)
         
         if model_path and os.path.exists(model_path):
             try:
-                self.model = load_model(model_path)
+                # Fast-load cache: HDF5 is parsed only on first conversion
+                self.model = registry.load_model(model_path)
                 logging.info('Successfully loaded model with %d parameters' % self.model.count_params())
             except Exception as e:
-                logging.error('Failed to load model: %s' % str(e))
-                self.model = None
+                logging.warning('Model registry load failed (%s), loading HDF5 directly' % str(e))
+                try:
+                    self.model = load_model(model_path)
+                    logging.info('Successfully loaded model with %d parameters' % self.model.count_params())
+                except Exception as e:
+                    logging.error('Failed to load model: %s' % str(e))
+                    self.model = None
         else:
             logging.warning('Model file not found. Available paths checked:')
-            for path in possible_paths:
+            for directory in MODEL_SEARCH_PATHS:
+                path = os.path.join(directory, _MODEL_FILENAME)
                 logging.warning('  %s - %s' % (path, 'EXISTS' if os.path.exists(path) else 'NOT FOUND'))
             logging.info('Running in mock mode for testing...')
             self.model = None
@@ -48,6 +53,56 @@ class EndToEndLaneFollower(object):
         self.car = car
         self.curr_steering_angle = 90
 
+        # (width, height) the model expects, distilled student models use a smaller input
+        self.input_size = (_MODEL_INPUT_SHAPE[1], _MODEL_INPUT_SHAPE[0])
+        input_shape = getattr(self.model, 'input_shape', None)
+        if input_shape is not None and None not in input_shape[1:3]:
+            self.input_size = (input_shape[2], input_shape[1])
+
+        # Warm-up state: cold = first predict, warm = steady state average
+        self.is_warm = self.model is None  # mock mode does not need warm-up
+        self.cold_latency_ms = None
+        self.warm_latency_ms = None
+        if warmup_runs > 0:
+            self.warm_up(warmup_runs)
+
+    def warm_up(self, runs=_WARMUP_RUNS):
+        """ Run the model on dummy inputs of the real shape, so graph tracing and
+            memory allocation happen here and not on the first frames of driving
+        """
+        if self.model is None:
+            return self.is_warm
+
+        input_shape = getattr(self.model, 'input_shape', None)
+        if input_shape is None or None in input_shape[1:]:
+            input_shape = (None,) + _MODEL_INPUT_SHAPE
+        X = np.zeros((1,) + tuple(input_shape[1:]), dtype=np.float32)
+
+        try:
+            latencies = []
+            for _ in range(max(2, runs)):
+                start_time = time.time()
+                self.model.predict(X)
+                latencies.append((time.time() - start_time) * 1000)
+        except Exception as e:
+            logging.error('Model warm-up failed: %s' % str(e))
+            return self.is_warm
+
+        self.cold_latency_ms = latencies[0]
+        self.warm_latency_ms = sum(latencies[1:]) / len(latencies[1:])
+        self.is_warm = True
+        logging.info('Model warm-up done in %d runs: cold=%.1fms, warm=%.1fms'
+                     % (len(latencies), self.cold_latency_ms, self.warm_latency_ms))
+        return self.is_warm
+
+    def latency_report(self):
+        """ Cold vs warm inference latency, measured by warm_up() """
+        return {
+            'is_warm': self.is_warm,
+            'cold_latency_ms': self.cold_latency_ms,
+            'warm_latency_ms': self.warm_latency_ms,
+        }
+
     def follow_lane(self, frame):
         # Main entry point of the lane follower
         show_image("orig", frame)
@@ -71,7 +126,7 @@ class EndToEndLaneFollower(object):
             return 90 + np.random.randint(-10, 10)
             
         try:
-            preprocessed = img_preprocess(frame)
+            preprocessed = img_preprocess(frame, self.input_size)
             X = np.asarray([preprocessed])
             steering_angle = self.model.predict(X)[0]
 
@@ -85,27 +140,6 @@ class EndToEndLaneFollower(object):
             return 90  # fallback to center
 
 
-def img_preprocess(image):
-    """
-    Preprocess image for Nvidia model
-    Enhanced with error handling
-    """
-    try:
-        height, width, channels = image.shape
-        if channels != 3:
-            logging.warning('Unexpected number of channels: %d' % channels)
-            
-        image = image[int(height/2):,:,:]  # remove top half of the image, as it is not relevant for lane following
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2YUV)  # Nvidia model said it is best to use YUV color space
-        image = cv2.GaussianBlur(image, (3,3), 0)
-        image = cv2.resize(image, (200,66)) # input image size (200,66) Nvidia model
-        image = image / 255.0 # normalizing
-        return image
-    except Exception as e:
-        logging.error('Error in image preprocessing: %s' % str(e))
-        # Return a default processed image
-        return np.zeros((66, 200, 3))
-
 def display_heading_line(frame, steering_angle, line_color=(0, 0, 255), line_width=5):
     """
     Enhanced with mathematical error handling
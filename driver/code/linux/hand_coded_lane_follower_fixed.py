@@ -38,6 +38,16 @@ class HandCodedLaneFollower(object):
 
         return curr_heading_image
 
+    def compute_steering(self, frame):
+        """ Steering only: no rendering and no wheel command
+            Returns (steering angle, number of lane lines)
+        """
+        lane_lines = detect_lane_lines(frame)
+        if len(lane_lines) > 0:
+            new_steering_angle = compute_steering_angle(frame, lane_lines)
+            self.curr_steering_angle = stabilize_steering_angle(self.curr_steering_angle, new_steering_angle, len(lane_lines))
+        return self.curr_steering_angle, len(lane_lines)
+
 
 ############################
 # Frame processing functions
@@ -62,6 +72,15 @@ def detect_lane(frame):
     return lane_lines, lane_lines_image
 
 
+def detect_lane_lines(frame):
+    """
+    Same as detect_lane, but only returns the lane lines without drawing the debug images
+    """
+    cropped_frame = crop_roi(frame)
+    line_segments = detect_line_segments(detect_edges(cropped_frame))
+    return average_slope_intercept(cropped_frame, line_segments)
+
+
 def crop_roi(frame):
     """
     Crop the image to region of interest to limit the lane detection area
@@ -123,6 +142,7 @@ def average_slope_intercept(frame, line_segments):
         return []
 
     height, width, _ = frame.shape
+    lane_lines = []
     left_fit = []
     right_fit = []
 
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Model Registry - lane modelleri icin hizli yukleme onbellegi (fast-load cache)
+
+.h5 modelleri bir kere duz (flat) agirlik dosyasina cevrilir. Her artifact
+icerik hash'i (sha256) ile isimlendirilir:
+    <name>-<hash>.v<FORMAT_VERSION>.json     model config + agirlik offsetleri
+    <name>-<hash>.v<FORMAT_VERSION>.weights  butun agirliklar, art arda float32
+
+Kazanc sadece yukleme suresindedir: HDF5 parse edilmez ve model dosyasinin
+son bulundugu yer hatirlanir. Agirliklar Keras set_weights() ile modelin kendi
+degiskenlerine kopyalanir; her process kendi kopyasini tutar, bellek
+process'ler arasinda paylasilmaz.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+FORMAT_VERSION = 1
+_ALIGNMENT = 64  # her agirlik dizisi 64 byte sinirinda baslar
+
+MODEL_SEARCH_PATHS = [
+    '/home/pi/DeepPiCar/models/lane_navigation/data/model_result',
+    os.path.join(os.path.dirname(__file__), '..', '..', '..', 'models', 'lane_navigation', 'data', 'model_result'),
+    './models/lane_navigation/data/model_result',
+    '../models/lane_navigation/data/model_result'
+]
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'DEEPPICAR_MODEL_REGISTRY', os.path.join(os.path.expanduser('~'), '.cache', 'deeppicar', 'models'))
+
+
+class ModelRegistry(object):
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.index = self._load_index()
+        self._weights = {}  # artifact hash -> list of memmap views (per process)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if index.get('format_version') == FORMAT_VERSION:
+                return index
+            logging.info('Model registry index has old format, rebuilding')
+        except (IOError, OSError, ValueError):
+            pass
+        return {'format_version': FORMAT_VERSION, 'sources': {}, 'resolved': {}}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def resolve(self, filename, search_paths=MODEL_SEARCH_PATHS):
+        """Find a model file, trying the last known location first"""
+        known_path = self.index['resolved'].get(filename)
+        if known_path and os.path.exists(known_path):
+            return known_path
+
+        for directory in search_paths:
+            path = os.path.abspath(os.path.join(directory, filename))
+            if os.path.exists(path):
+                logging.info('Found model at: %s' % path)
+                self.index['resolved'][filename] = path
+                self._save_index()
+                return path
+        return None
+
+    def content_hash(self, h5_path):
+        """sha256 of the model file, cached by (size, mtime)"""
+        h5_path = os.path.abspath(h5_path)
+        stat = os.stat(h5_path)
+        entry = self.index['sources'].get(h5_path)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry['sha256']
+
+        sha = hashlib.sha256()
+        with open(h5_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        self.index['sources'][h5_path] = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                                          'sha256': sha.hexdigest()}
+        self._save_index()
+        return sha.hexdigest()
+
+    def artifact_paths(self, h5_path):
+        name = os.path.splitext(os.path.basename(h5_path))[0]
+        base = os.path.join(self.cache_dir, '%s-%s.v%d' % (name, self.content_hash(h5_path)[:16], FORMAT_VERSION))
+        return base + '.json', base + '.weights'
+
+    def convert(self, h5_path):
+        """Convert an .h5 model once, returns the manifest path"""
+        manifest_path, weights_path = self.artifact_paths(h5_path)
+        if os.path.exists(manifest_path) and os.path.exists(weights_path):
+            return manifest_path
+
+        from keras.models import load_model
+        logging.info('Converting %s into model registry...' % h5_path)
+        model = load_model(h5_path)
+
+        entries = []
+        offset = 0
+        arrays = [np.ascontiguousarray(w, dtype=np.float32) for w in model.get_weights()]
+        for array in arrays:
+            offset = (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+            entries.append({'shape': list(array.shape), 'dtype': '<f4', 'offset': offset})
+            offset += array.nbytes
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = weights_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for entry, array in zip(entries, arrays):
+                f.seek(entry['offset'])
+                f.write(array.astype('<f4').tobytes())
+            f.truncate(offset)
+        os.replace(tmp_path, weights_path)
+
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'source': os.path.abspath(h5_path),
+            'sha256': self.content_hash(h5_path),
+            'model_config': model.to_json(),
+            'input_shape': list(model.input_shape[1:]),
+            'weights': entries,
+            'total_bytes': offset,
+        }
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+        logging.info('Model registry artifact written: %s (%d bytes)' % (weights_path, offset))
+        return manifest_path
+
+    def load_manifest(self, manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError('Unsupported model artifact version: %s' % manifest.get('format_version'))
+        return manifest
+
+    def load_weights(self, manifest_path):
+        """Memory-mapped, read-only weight arrays of a converted model"""
+        manifest = self.load_manifest(manifest_path)
+        key = manifest['sha256']
+        if key not in self._weights:
+            weights_path = os.path.splitext(manifest_path)[0] + '.weights'
+            buffer = np.memmap(weights_path, dtype=np.uint8, mode='r', shape=(manifest['total_bytes'],))
+            views = []
+            for entry in manifest['weights']:
+                count = int(np.prod(entry['shape']))
+                view = np.frombuffer(buffer, dtype=entry['dtype'], count=count, offset=entry['offset'])
+                views.append(view.reshape(entry['shape']))
+            self._weights[key] = views
+        return self._weights[key]
+
+    def load_model(self, h5_path):
+        """Build a Keras model from a registry artifact, converting it first if needed
+        set_weights copies the arrays into the model, the cache only saves the HDF5 parsing
+        """
+        from keras.models import model_from_json
+        manifest_path = self.convert(h5_path)
+        manifest = self.load_manifest(manifest_path)
+        model = model_from_json(manifest['model_config'])
+        model.set_weights(self.load_weights(manifest_path))
+        return model
+
+
+_registry = None
+
+
+def get_model_registry():
+    """Process wide registry, so all followers of a process share the index"""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    return _registry
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    registry = get_model_registry()
+    h5_path = sys.argv[1] if len(sys.argv) > 1 else registry.resolve('lane_navigation.h5')
+    if h5_path is None:
+        logging.error('No model file found')
+        sys.exit(1)
+
+    manifest_path = registry.convert(h5_path)
+    weights = registry.load_weights(manifest_path)
+    logging.info('Artifact: %s, %d weight arrays, %d parameters'
+                 % (manifest_path, len(weights), sum(w.size for w in weights)))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Steering Arbiter - hand-coded ve end-to-end lane follower'i ayni anda calistirir
+
+Her frame icin iki follower paralel calisir ve bir zaman butcesi (time budget)
+icinde biten sonuclar guven (confidence) degerlerine gore birlestirilir:
+    - hand-coded: detect_lane'in buldugu lane line sayisi (2 > 1 > 0)
+    - end-to-end: model yuklu mu (mock modda guven 0)
+    - her ikisi icin: sonucun yasi, eski sonuclar daha az agirlik alir
+Acilar birbirine yakinsa agirlikli ortalama alinir; max_disagreement_deg'den
+fazla farkliysa (orn. 60 ve 120) ortalama hicbir seridi takip etmez, en guvenilir
+taze sonuc kullanilir.
+Deadline'i kaciran follower bir sonraki frame'e kadar calismaya devam eder,
+o frame icin hazir olan sonuc kullanilir.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from hand_coded_lane_follower_fixed import display_heading_line
+
+_TIME_BUDGET_MS = 40  # 20 fps kamera icin frame basina 50ms var
+_MAX_RESULT_AGE_MS = 250  # bundan eski sonuclarin agirligi 0
+_LANE_LINE_CONFIDENCE = {0: 0.0, 1: 0.5, 2: 1.0}
+_MODEL_CONFIDENCE = 0.7
+_MAX_DISAGREEMENT_DEG = 15  # acilar bundan fazla farkliysa ortalama alma
+
+
+class FollowerResult(object):
+
+    def __init__(self, angle, confidence, timestamp):
+        self.angle = angle
+        self.confidence = confidence
+        self.timestamp = timestamp  # capture time of the frame this result belongs to
+
+
+class SteeringArbiter(object):
+
+    def __init__(self, car=None, lane_follower=None, end_to_end_lane_follower=None,
+                 time_budget_ms=_TIME_BUDGET_MS, max_result_age_ms=_MAX_RESULT_AGE_MS,
+                 max_disagreement_deg=_MAX_DISAGREEMENT_DEG):
+        logging.info('Creating a SteeringArbiter (budget %dms)...' % time_budget_ms)
+        self.car = car
+        self.time_budget = time_budget_ms / 1000.0
+        self.max_result_age = max_result_age_ms / 1000.0
+        self.max_disagreement = max_disagreement_deg
+        self.curr_steering_angle = 90
+
+        self.tasks = {}
+        if lane_follower is not None:
+            self.tasks['hand_coded'] = lambda frame: self.run_hand_coded(lane_follower, frame)
+        if end_to_end_lane_follower is not None:
+            self.tasks['end_to_end'] = lambda frame: self.run_end_to_end(end_to_end_lane_follower, frame)
+
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.tasks)))
+        self.pending = {}  # name -> (future, frame timestamp)
+        self.results = {}  # name -> FollowerResult
+        self.deadline_misses = dict((name, 0) for name in self.tasks)
+
+    @staticmethod
+    def run_hand_coded(follower, frame):
+        angle, num_of_lane_lines = follower.compute_steering(frame)
+        return angle, _LANE_LINE_CONFIDENCE.get(num_of_lane_lines, 1.0)
+
+    @staticmethod
+    def run_end_to_end(follower, frame):
+        if follower.model is None:
+            # mock mode returns a random angle, don't let it steer
+            return follower.curr_steering_angle, 0.0
+        follower.curr_steering_angle = follower.compute_steering_angle(frame)
+        return follower.curr_steering_angle, _MODEL_CONFIDENCE
+
+    def follow_lane(self, frame):
+        # Main entry point, same interface as the lane followers
+        now = time.time()
+        deadline = now + self.time_budget
+
+        for name, task in self.tasks.items():
+            if name in self.pending:
+                continue  # still busy with an older frame
+            self.pending[name] = (self.executor.submit(task, frame), now)
+
+        wait([future for future, _ in self.pending.values()], timeout=max(0, deadline - time.time()))
+
+        for name in list(self.pending):
+            future, timestamp = self.pending[name]
+            if not future.done():
+                if timestamp == now:
+                    self.deadline_misses[name] += 1
+                    logging.debug('%s missed the %.0fms deadline' % (name, self.time_budget * 1000))
+                continue
+            del self.pending[name]
+            try:
+                angle, confidence = future.result()
+                self.results[name] = FollowerResult(angle, confidence, timestamp)
+            except Exception as e:
+                logging.error('%s lane follower failed: %s' % (name, str(e)))
+
+        self.curr_steering_angle = self.fuse(time.time())
+        logging.debug("curr_steering_angle = %d" % self.curr_steering_angle)
+
+        if self.car is not None:
+            self.car.front_wheels.turn(self.curr_steering_angle)
+        return display_heading_line(frame, self.curr_steering_angle)
+
+    def fuse(self, now):
+        """
+        Confidence and age weighted average of the latest follower results when they agree,
+        the angle of the highest weighted result when they differ by more than max_disagreement
+        """
+        weighted = []
+        for name, result in self.results.items():
+            age = now - result.timestamp
+            weight = result.confidence * max(0.0, 1.0 - age / self.max_result_age)
+            if weight > 0:
+                weighted.append((weight, result.angle, name))
+
+        if not weighted:
+            logging.debug('No confident steering result, keeping %d' % self.curr_steering_angle)
+            return self.curr_steering_angle
+
+        angles = [angle for _, angle, _ in weighted]
+        if max(angles) - min(angles) > self.max_disagreement:
+            weight, angle, name = max(weighted)
+            logging.debug('Followers disagree (%s), using %s' % (angles, name))
+        else:
+            angle = sum(w * a for w, a, _ in weighted) / sum(w for w, _, _ in weighted)
+        return int(max(0, min(180, angle)) + 0.5)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        if self.deadline_misses:
+            logging.info('Steering arbiter deadline misses: %s' % self.deadline_misses)
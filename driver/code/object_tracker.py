@@ -0,0 +1,121 @@
+import itertools
+import logging
+import time
+
+import numpy as np
+
+from detection_batch import DetectionBatch
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """(len(a), len(b)) IoU of x1, y1, x2, y2 boxes"""
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-6)
+
+
+class Track(object):
+    """One tracked object, box moves with constant velocity (pixels per second) between detections"""
+    __slots__ = ('track_id', 'label_id', 'score', 'box', 'velocity', 'hits', 'misses', 'last_time', 'confirmed')
+
+    def __init__(self, track_id, label_id, score, box, now):
+        self.track_id = track_id
+        self.label_id = label_id
+        self.score = score
+        self.box = box
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.hits = 1
+        self.misses = 0
+        self.last_time = now
+        self.confirmed = False
+
+    def predict(self, now):
+        return self.box + self.velocity * (now - self.last_time)
+
+    def update(self, score, box, now):
+        dt = now - self.last_time
+        if dt > 0:
+            # smoothed, so one jittery detection does not throw the prediction off
+            self.velocity = 0.5 * self.velocity + 0.5 * (box - self.box) / dt
+        self.box = box
+        self.score = score
+        self.last_time = now
+        self.hits += 1
+        self.misses = 0
+
+
+class ObjectTracker(object):
+    """
+    SORT-style tracker between the object detector and the traffic object handlers
+    Detections are matched to tracks of the same label by IoU (greedy, best first).
+    A track is reported once it was detected confirm_frames times, and keeps being
+    reported with a predicted box for up to max_misses detector runs without a match.
+    """
+
+    def __init__(self, iou_threshold=0.3, confirm_frames=3, max_misses=3):
+        self.iou_threshold = iou_threshold
+        self.confirm_frames = confirm_frames
+        self.max_misses = max_misses
+        self.tracks = []
+        self.track_ids = itertools.count()
+
+    def update(self, batch, now=None):
+        """Match the detector output of this frame, returns the confirmed tracks as a DetectionBatch"""
+        if now is None:
+            now = time.time()
+        boxes = batch.boxes
+        matched_tracks = set()
+        matched_detections = set()
+        if self.tracks and len(batch):
+            predicted = np.array([t.predict(now) for t in self.tracks], dtype=np.float32)
+            ious = iou_matrix(predicted, boxes)
+            same_label = np.array([t.label_id for t in self.tracks])[:, None] == batch.label_ids[None, :]
+            ious[~same_label] = 0
+            for flat in np.argsort(-ious, axis=None):
+                t, d = np.unravel_index(flat, ious.shape)
+                if ious[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_detections:
+                    continue
+                self.tracks[t].update(float(batch.scores[d]), boxes[d], now)
+                matched_tracks.add(t)
+                matched_detections.add(d)
+
+        kept = []
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.misses += 1
+                if not track.confirmed or track.misses > self.max_misses:
+                    logging.debug('Track %d dropped' % track.track_id)
+                    continue
+            if not track.confirmed and track.hits >= self.confirm_frames:
+                track.confirmed = True
+                logging.debug('Track %d confirmed (label %d)' % (track.track_id, track.label_id))
+            kept.append(track)
+        for d in range(len(batch)):
+            if d not in matched_detections:
+                track = Track(next(self.track_ids), int(batch.label_ids[d]), float(batch.scores[d]), boxes[d], now)
+                track.confirmed = self.confirm_frames <= 1
+                kept.append(track)
+        self.tracks = kept
+        return self.predict(now)
+
+    def predict(self, now=None):
+        """Confirmed tracks with their boxes predicted at `now`, for frames without a detector run"""
+        if now is None:
+            now = time.time()
+        confirmed = [t for t in self.tracks if t.confirmed]
+        if not confirmed:
+            return DetectionBatch()
+        return DetectionBatch.from_arrays([t.label_id for t in confirmed],
+                                          [t.score for t in confirmed],
+                                          [t.predict(now) for t in confirmed])
+
+    def reset(self):
+        self.tracks = []
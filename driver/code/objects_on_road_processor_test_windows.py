@@ -5,9 +5,18 @@ import time
 import numpy as np
 from PIL import Image
 from traffic_objects import *
+from detection_annotator import DetectionAnnotator
+from detection_batch import DetectionBatch
+from object_tracker import ObjectTracker
+from traffic_rules import TrafficRuleEngine
 
 _SHOW_IMAGE = False
 
+# Driving states, advanced by tick(now) every frame
+DRIVING = 'driving'
+STOPPED = 'stopped'    # speed 0, held for at least full_stop_sec
+RESUMING = 'resuming'  # ramping up from 0 to the target speed
+
 
 class MockDetectedObject:
     """Mock object to simulate EdgeTPU detection results"""
@@ -27,7 +36,14 @@ class ObjectsOnRoadProcessorWindows(object):
                  car=None,
                  speed_limit=40,
                  width=640,
-                 height=480):
+                 height=480,
+                 full_stop_sec=1.0,
+                 resume_ramp_sec=1.0,
+                 detect_every_n_frames=1,
+                 confirm_frames=3,
+                 detection_worker=None,
+                 annotate=False,
+                 detection_gate=None):
         logging.info('Creating a ObjectsOnRoadProcessorWindows (Mock Version)...')
         self.width = width
         self.height = height
@@ -37,6 +53,25 @@ class ObjectsOnRoadProcessorWindows(object):
         self.speed_limit = speed_limit
         self.speed = speed_limit
 
+        # Stop/resume state machine, replaces the blocking sleep after a full stop
+        self.full_stop_sec = full_stop_sec
+        self.resume_ramp_sec = resume_ramp_sec
+        self.state = DRIVING
+        self.target_speed = speed_limit
+        self.stop_until = 0
+        self.ramp_start_time = 0
+        self.ramp_start_speed = 0
+
+        # Detector runs every n-th frame, the tracker confirms objects over
+        # confirm_frames detections and predicts their boxes in between
+        self.detect_every_n_frames = max(1, detect_every_n_frames)
+        self.tracker = ObjectTracker(confirm_frames=confirm_frames)
+        self.frame_count = 0
+        # optional DetectionWorker, runs the detector in its own process
+        self.detection_worker = detection_worker
+        # optional DetectionGate, replaces every n-th frame by a scene change test
+        self.detection_gate = detection_gate
+
         # Mock labels (simplified version)
         self.labels = {
             0: 'Green Traffic Light',
@@ -49,6 +84,8 @@ class ObjectsOnRoadProcessorWindows(object):
 
         self.min_confidence = 0.30
         self.num_of_objects = 3
+        # closeness threshold per label id, see TrafficObject.is_close_by
+        self.min_height_pct = np.full(len(self.labels), 0.05, dtype=np.float32)
         logging.info('Mock Edge TPU initialized.')
 
         # initialize open cv for drawing boxes
@@ -62,6 +99,12 @@ class ObjectsOnRoadProcessorWindows(object):
         self.annotate_text = ""
         self.annotate_text_time = time.time()
         self.time_to_show_prediction = 1.0  # ms
+        # Detections are kept as metadata of the last detected frame; detect_objects draws nothing
+        # unless annotate=True. Display and recording call render_annotations() on their frames
+        self.annotate = annotate
+        self.annotator = DetectionAnnotator(self.labels, self.font, self.fontScale, self.boxColor, self.fontColor,
+                                            self.boxLineWidth, self.lineType)
+        self.annotations = None
 
         # Traffic objects
         self.traffic_objects = {0: GreenTrafficLight(),
@@ -70,54 +113,114 @@ class ObjectsOnRoadProcessorWindows(object):
                                 3: SpeedLimit(25),
                                 4: SpeedLimit(40),
                                 5: StopSign()}
+        self.rules = TrafficRuleEngine(self.traffic_objects, self.labels)
 
     def process_objects_on_road(self, frame):
         # Main entry point of the Road Object Handler
         logging.debug('Processing objects.................................')
-        objects, final_frame = self.detect_objects(frame)
-        self.control_car(objects)
+        now = time.time()
+        if self.detection_worker is not None:
+            # never waits for the detector, results are matched at the time their frame was taken
+            final_frame = frame
+            self.detection_worker.submit(frame, now)
+            try:
+                result = self.detection_worker.poll()
+            except RuntimeError as e:
+                # tracks of a dead worker only get older, detect in this process from now on
+                logging.error('%s, detecting in the main loop' % e)
+                self.detection_worker = None
+                self.tracker.reset()
+                objects, final_frame = self.detect_objects(frame)
+                result = None
+                tracked = self.tracker.update(DetectionBatch.from_objects(objects), now)
+            if self.detection_worker is not None:
+                if result is not None:
+                    self.tracker.update(result.batch, result.frame_time)
+                tracked = self.tracker.predict(now)
+        elif self.should_detect(frame, now):
+            objects, final_frame = self.detect_objects(frame)
+            tracked = self.tracker.update(DetectionBatch.from_objects(objects), now)
+        else:
+            final_frame = frame
+            tracked = self.tracker.predict(now)
+        self.frame_count += 1
+        self.control_car(tracked, now)
         logging.debug('Processing objects END..............................')
 
         return final_frame
 
-    def control_car(self, objects):
-        logging.debug('Control car...')
-        car_state = {"speed": self.speed_limit, "speed_limit": self.speed_limit}
+    def should_detect(self, frame, now):
+        if self.detection_gate is not None:
+            return self.detection_gate.should_detect(frame, now)
+        return self.frame_count % self.detect_every_n_frames == 0
 
-        if len(objects) == 0:
+    def control_car(self, objects, now=None):
+        """objects -- DetectionBatch, or a list of objects with label_id, score and bounding_box"""
+        logging.debug('Control car...')
+        if now is None:
+            now = time.time()
+        batch = objects if isinstance(objects, DetectionBatch) else DetectionBatch.from_objects(objects)
+        batch = batch.select((batch.label_ids >= 0) & (batch.label_ids < len(self.labels)))
+        batch = batch.filter_confidence(self.min_confidence)
+        if len(batch) == 0:
             logging.debug('No objects detected, drive at speed limit of %s.' % self.speed_limit)
 
-        contain_stop_sign = False
-        for obj in objects:
-            obj_label = self.labels[obj.label_id]
-            processor = self.traffic_objects[obj.label_id]
-            if processor.is_close_by(obj, self.height):
-                processor.set_car_state(car_state)
-                logging.info('[%s] object detected and is close by, taking action.' % obj_label)
-            else:
-                logging.debug("[%s] object detected, but it is too far, ignoring." % obj_label)
-            if obj_label == 'Stop Sign':
-                contain_stop_sign = True
+        close = batch.close_by(self.height, self.min_height_pct)
+        car_state = self.rules.decide(batch.label_ids[close], self.speed_limit, now)
+        for label_id in batch.label_set(~close):
+            logging.debug("[%s] object detected, but it is too far, ignoring." % self.labels[label_id])
+        contain_stop_sign = bool((batch.label_ids == 5).any())
 
         if not contain_stop_sign:
             self.traffic_objects[5].clear()
 
-        self.resume_driving(car_state)
+        self.resume_driving(car_state, now)
 
-    def resume_driving(self, car_state):
-        old_speed = self.speed
+    def resume_driving(self, car_state, now=None):
+        """Set the target speed from car_state, the speed itself is changed by tick"""
+        if now is None:
+            now = time.time()
         self.speed_limit = car_state['speed_limit']
-        self.speed = car_state['speed']
+        self.target_speed = car_state['speed'] if car_state['speed'] == 0 else self.speed_limit
+        self.tick(now)
+
+    def tick(self, now=None):
+        """Advance stop timers and the resume ramp, call every frame; never blocks"""
+        if now is None:
+            now = time.time()
+        self.traffic_objects[5].tick(now)
+        old_speed = self.speed
 
-        if self.speed == 0:
+        if self.target_speed == 0:
+            if self.state != STOPPED:
+                logging.info('FULL STOP for at least %.1f second(s)' % self.full_stop_sec)
+                self.state = STOPPED
+                self.stop_until = now + self.full_stop_sec
             self.set_speed(0)
-        else:
-            self.set_speed(self.speed_limit)
-        logging.info('Speed change: %d → %d' % (old_speed, self.speed))
+        elif self.state == STOPPED:
+            if now >= self.stop_until:
+                self.state = RESUMING
+                self.ramp_start_time = now
+                self.ramp_start_speed = self.speed
+        elif self.target_speed <= self.speed:
+            # slowing down is never delayed
+            self.state = DRIVING
+            self.set_speed(self.target_speed)
+        elif self.state == DRIVING:
+            self.set_speed(self.target_speed)
+
+        if self.state == RESUMING:
+            if self.resume_ramp_sec > 0:
+                progress = min(1.0, (now - self.ramp_start_time) / self.resume_ramp_sec)
+            else:
+                progress = 1.0
+            speed = self.ramp_start_speed + (self.target_speed - self.ramp_start_speed) * progress
+            self.set_speed(int(round(speed)))
+            if progress >= 1.0:
+                self.state = DRIVING
 
-        if self.speed == 0:
-            logging.info('FULL STOP for 1 second')
-            time.sleep(1)
+        if self.speed != old_speed:
+            logging.info('Speed change: %d → %d' % (old_speed, self.speed))
 
     def set_speed(self, speed):
         # Use this setter, so we can test this class without a car attached
@@ -161,20 +264,11 @@ class ObjectsOnRoadProcessorWindows(object):
         # Get mock objects
         objects = self.mock_detect_objects_from_filename(filename)
         
-        # Draw detection boxes and labels
         if objects:
             for obj in objects:
                 height = obj.bounding_box[1][1] - obj.bounding_box[0][1]
                 width = obj.bounding_box[1][0] - obj.bounding_box[0][0]
                 logging.debug("%s, %.0f%% w=%.0f h=%.0f" % (self.labels[obj.label_id], obj.score * 100, width, height))
-                
-                box = obj.bounding_box
-                coord_top_left = (int(box[0][0]), int(box[0][1]))
-                coord_bottom_right = (int(box[1][0]), int(box[1][1]))
-                cv2.rectangle(frame, coord_top_left, coord_bottom_right, self.boxColor, self.boxLineWidth)
-                annotate_text = "%s %.0f%%" % (self.labels[obj.label_id], obj.score * 100)
-                coord_top_left = (coord_top_left[0], coord_top_left[1] + 15)
-                cv2.putText(frame, annotate_text, coord_top_left, self.font, self.fontScale, self.boxColor, self.lineType)
         else:
             logging.debug('No object detected')
 
@@ -184,10 +278,18 @@ class ObjectsOnRoadProcessorWindows(object):
         else:
             annotate_summary = "High FPS (MOCK)"
         logging.debug(annotate_summary)
-        cv2.putText(frame, annotate_summary, self.bottomLeftCornerOfText, self.font, self.fontScale, self.fontColor, self.lineType)
+        self.annotations = self.annotator.record(objects, annotate_summary, start_ms)
+        if self.annotate:
+            self.render_annotations(frame)
 
         return objects, frame
 
+    def render_annotations(self, frame):
+        """Draw the boxes and labels of the last detection onto frame, for frames that are shown or recorded"""
+        if self.annotations is not None:
+            self.annotator.render(frame, self.annotations)
+        return frame
+
 
 ############################
 # Test Functions
@@ -205,6 +307,7 @@ def test_photo(file):
     import os
     filename = os.path.basename(file)
     combo_image = object_processor.detect_objects(frame, filename)[1]
+    object_processor.render_annotations(combo_image)  # returned for display
     object_processor.control_car(object_processor.mock_detect_objects_from_filename(filename))
     
     print("Final speed: %d" % object_processor.speed)
@@ -234,7 +337,15 @@ def test_stop_sign_sequence():
     
     print("4. After wait period - should resume:")
     objects = object_processor.mock_detect_objects_from_filename('green_light.jpg')
-    object_processor.control_car(objects)
+    now = time.time()
+    object_processor.control_car(objects, now)
+    print("Speed at start of resume ramp: %d (%s)" % (object_processor.speed, object_processor.state))
+
+    print("5. Tick through the %.1f second resume ramp:" % object_processor.resume_ramp_sec)
+    for step in range(1, 5):
+        object_processor.tick(now + object_processor.resume_ramp_sec * step / 4)
+        print("Speed: %d (%s)" % (object_processor.speed, object_processor.state))
+    print("Final speed: %d" % object_processor.speed)
 
 def test_all_objects():
     """Test all object types"""
@@ -1,27 +1,126 @@
 import cv2
 import sys
+import os
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from hand_coded_lane_follower_test_windows import HandCodedLaneFollower
 
+_SEGMENT_FRAMES = 100  # video bu kadar frame'lik parcalara bolunur, her parca bir process'te islenir
+_PRIME_FRAMES = 10  # stabilize_steering_angle onceki aciya bagli, segmentten once bu kadar frame isle
+_WRITER_THREADS = 4
 
-def save_image_and_steering_angle(video_file):
+
+def frame_filename(video_file, i, steering_angle):
+    return "%s_%03d_%03d.png" % (video_file, i, steering_angle)
+
+
+def load_manifest(video_file):
+    """Progress manifest: frame index -> steering angle of every frame already written"""
+    try:
+        with open(video_file + '_manifest.json', 'r') as f:
+            frames = json.load(f)['frames']
+    except (IOError, OSError, ValueError, KeyError):
+        return {}
+
+    done = {}
+    for i, steering_angle in frames.items():
+        i = int(i)
+        if os.path.exists(frame_filename(video_file, i, steering_angle)):
+            done[i] = steering_angle
+    return done
+
+
+def save_manifest(video_file, done, frame_count):
+    path = video_file + '_manifest.json'
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'video': video_file + '.avi', 'frame_count': frame_count,
+                   'frames': dict((str(i), angle) for i, angle in sorted(done.items()))}, f)
+    os.replace(path + '.tmp', path)
+
+
+def count_frames(video_file):
+    cap = cv2.VideoCapture(video_file + '.avi')
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if frame_count <= 0:
+        # some containers don't store the frame count, count by grabbing
+        frame_count = 0
+        while cap.grab():
+            frame_count += 1
+    cap.release()
+    return frame_count
+
+
+def init_worker():
+    logging.getLogger().setLevel(logging.WARNING)  # the lane follower logs every frame
+
+
+def process_segment(video_file, start, end, done):
+    """Worker: steering angles for frames [start, end), written through an I/O thread pool
+    done -- frame index -> angle of frames that are already written, they are skipped
+    """
     lane_follower = HandCodedLaneFollower()
     cap = cv2.VideoCapture(video_file + '.avi')
+    prime_start = max(0, start - _PRIME_FRAMES)
+    if prime_start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, prime_start)
 
+    results = {}
+    writes = []
     try:
-        i = 0
-        while cap.isOpened():
-            _, frame = cap.read()
-            if frame is None:
-                break
-            lane_follower.follow_lane(frame)
-            cv2.imwrite("%s_%03d_%03d.png" % (video_file, i, lane_follower.curr_steering_angle), frame)
-            i += 1
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        with ThreadPoolExecutor(max_workers=_WRITER_THREADS) as writer:
+            for i in range(prime_start, end):
+                if i in done:
+                    # already written: keep the stabilizer state, don't decode the frame
+                    lane_follower.curr_steering_angle = done[i]
+                    if not cap.grab():
+                        break
+                    continue
+
+                _, frame = cap.read()
+                if frame is None:
+                    break
+                lane_follower.compute_steering(frame)
+                if i < start:
+                    continue  # priming frame, belongs to the previous segment
+
+                results[i] = lane_follower.curr_steering_angle
+                writes.append(writer.submit(cv2.imwrite, frame_filename(video_file, i, results[i]), frame))
+
+            for write in writes:
+                write.result()
     finally:
         cap.release()
-        cv2.destroyAllWindows()
+    return results
+
+
+def save_image_and_steering_angle(video_file, workers=None, segment_frames=_SEGMENT_FRAMES):
+    done = load_manifest(video_file)
+    frame_count = count_frames(video_file)
+    logging.info('%s: %d frames, %d already done' % (video_file, frame_count, len(done)))
+
+    segments = []
+    for start in range(0, frame_count, segment_frames):
+        end = min(start + segment_frames, frame_count)
+        if any(i not in done for i in range(start, end)):
+            segments.append((start, end))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        futures = {}
+        for start, end in segments:
+            segment_done = dict((i, done[i]) for i in range(max(0, start - _PRIME_FRAMES), end) if i in done)
+            futures[pool.submit(process_segment, video_file, start, end, segment_done)] = (start, end)
+
+        for future in as_completed(futures):
+            start, end = futures[future]
+            done.update(future.result())
+            save_manifest(video_file, done, frame_count)
+            logging.info('frames %d-%d done (%d/%d)' % (start, end - 1, len(done), frame_count))
+
+    return done
 
 
 if __name__ == '__main__':
-    save_image_and_steering_angle(sys.argv[1])
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    save_image_and_steering_angle(sys.argv[1], workers)
@@ -4,6 +4,9 @@ import time
 
 class TrafficObject(object):
     """Base class for all traffic objects"""
+
+    # Rule precedence in traffic_rules.TrafficRuleEngine, higher runs later and wins
+    priority = 0
     
     def __init__(self):
         pass
@@ -35,6 +38,7 @@ class TrafficObject(object):
 
 class RedTrafficLight(TrafficObject):
     """Red traffic light - stops the car"""
+    priority = 40
     
     def __init__(self):
         super(RedTrafficLight, self).__init__()
@@ -47,6 +51,7 @@ class RedTrafficLight(TrafficObject):
 
 class GreenTrafficLight(TrafficObject):
     """Green traffic light - allows normal driving"""
+    priority = 10
     
     def __init__(self):
         super(GreenTrafficLight, self).__init__()
@@ -59,6 +64,7 @@ class GreenTrafficLight(TrafficObject):
 
 class Person(TrafficObject):
     """Person detected - stops the car for safety"""
+    priority = 50
     
     def __init__(self):
         super(Person, self).__init__()
@@ -71,6 +77,7 @@ class Person(TrafficObject):
 
 class SpeedLimit(TrafficObject):
     """Speed limit sign - changes speed limit"""
+    priority = 20
     
     def __init__(self, speed_limit):
         super(SpeedLimit, self).__init__()
@@ -87,44 +94,56 @@ class SpeedLimit(TrafficObject):
 
 
 class StopSign(TrafficObject):
-    """Stop sign - stops car and waits for specified time"""
+    """Stop sign - stops car and waits for specified time
+
+    The wait is a timer advanced by tick(now), nothing blocks. Once the wait is
+    over the car may pass the sign; it only stops again after the sign was
+    cleared from view.
+    """
+    priority = 30
     
     def __init__(self, wait_time_in_sec=2):
         super(StopSign, self).__init__()
         self.wait_time_in_sec = wait_time_in_sec
         self.start_wait_time = None
         self.in_wait_mode = False
+        self.wait_done = False
         logging.debug("StopSign created (wait time: %ds)" % wait_time_in_sec)
     
-    def set_car_state(self, car_state):
-        current_time = time.time()
-        
+    def set_car_state(self, car_state, now=None):
+        if now is None:
+            now = time.time()
+        self.tick(now)
+
+        if self.wait_done:
+            # Already stopped for this sign, keep driving until it is out of view
+            return
+
         if not self.in_wait_mode:
             # First time seeing stop sign
             logging.info("🛑 STOP SIGN: Starting %d second wait" % self.wait_time_in_sec)
-            self.start_wait_time = current_time
+            self.start_wait_time = now
             self.in_wait_mode = True
-            car_state['speed'] = 0
-            
-        elif self.in_wait_mode:
-            # Check if wait time is over
-            elapsed_time = current_time - self.start_wait_time
-            
-            if elapsed_time < self.wait_time_in_sec:
-                # Still waiting
-                remaining = self.wait_time_in_sec - elapsed_time
-                logging.debug("🛑 STOP SIGN: Still waiting (%.1fs remaining)" % remaining)
-                car_state['speed'] = 0
-            else:
-                # Wait time is over
-                logging.info("🛑 STOP SIGN: Wait complete, can proceed")
-                self.in_wait_mode = False
-                self.start_wait_time = None
-                # Don't change speed here - let other systems handle acceleration
+        else:
+            remaining = self.wait_time_in_sec - (now - self.start_wait_time)
+            logging.debug("🛑 STOP SIGN: Still waiting (%.1fs remaining)" % remaining)
+        car_state['speed'] = 0
+
+    def tick(self, now=None):
+        """Advance the wait timer, called every frame whether the sign is seen or not"""
+        if now is None:
+            now = time.time()
+        if self.in_wait_mode and now - self.start_wait_time >= self.wait_time_in_sec:
+            logging.info("🛑 STOP SIGN: Wait complete, can proceed")
+            self.in_wait_mode = False
+            self.start_wait_time = None
+            self.wait_done = True
+            # Don't change speed here - let other systems handle acceleration
     
     def clear(self):
         """Clear stop sign state when no longer detected"""
         if self.in_wait_mode:
             logging.debug("🛑 STOP SIGN: Cleared from view")
         self.in_wait_mode = False
-        self.start_wait_time = None 
\ No newline at end of file
+        self.start_wait_time = None
+        self.wait_done = False
@@ -0,0 +1,152 @@
+"""
+Offline accuracy and latency benchmark for lane followers
+
+Runs every registered follower over the labeled image set, where the ground
+truth steering angle is encoded in the filename (video01_XXX_ANGLE.png), and
+reports angle error, per-frame latency and throughput.
+
+The image set is loaded once in the parent process; each follower runs in
+its own worker process, so the followers are measured in parallel and
+TensorFlow only gets loaded in the workers that need it.
+
+Usage:
+python benchmark_lane_followers.py
+python benchmark_lane_followers.py --followers hand_coded end_to_end --json result.json
+python benchmark_lane_followers.py --variant student=/path/to/lane_navigation_student.h5
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'driver', 'code', 'linux'))
+
+from lane_dataset import DATA_DIR, load_labeled_images
+
+
+def create_hand_coded_follower(model_path=None):
+    from hand_coded_lane_follower_fixed import HandCodedLaneFollower
+    follower = HandCodedLaneFollower()
+    return lambda frame: follower.compute_steering(frame)[0]
+
+
+def create_end_to_end_follower(model_path=None):
+    from end_to_end_lane_follower_fixed import EndToEndLaneFollower
+    follower = EndToEndLaneFollower(model_path=model_path)
+    if follower.model is None:
+        raise RuntimeError('no model available, end-to-end follower would only return random angles')
+    return follower.compute_steering_angle
+
+
+# name -> (factory, model path); factories must be module level so workers can import them
+FOLLOWERS = {
+    'hand_coded': (create_hand_coded_follower, None),
+    'end_to_end': (create_end_to_end_follower, None),
+}
+
+
+def register_follower(name, factory, model_path=None):
+    """Add a follower variant, factory(model_path) returns a frame -> steering angle callable"""
+    FOLLOWERS[name] = (factory, model_path)
+
+
+_frames = None
+_angles = None
+
+
+def init_worker(frames, angles):
+    """Workers get the image set once at start-up (inherited without a copy on fork)"""
+    global _frames, _angles
+    _frames, _angles = frames, angles
+    logging.getLogger().setLevel(logging.WARNING)  # followers log every frame
+
+
+def run_follower(name, factory, model_path):
+    """Worker: run one follower over all frames, returns its result row"""
+    frames, angles = _frames, _angles
+    try:
+        compute_angle = factory(model_path)
+    except Exception as e:
+        return {'follower': name, 'error': str(e)}
+
+    predicted = np.zeros(len(frames), dtype=np.float32)
+    latencies = np.zeros(len(frames), dtype=np.float64)
+    start_time = time.time()
+    for i, frame in enumerate(frames):
+        frame_start = time.time()
+        predicted[i] = compute_angle(frame)
+        latencies[i] = time.time() - frame_start
+    total_time = time.time() - start_time
+
+    errors = np.abs(predicted - angles)
+    return {
+        'follower': name,
+        'frames': len(frames),
+        'mean_error': float(errors.mean()),
+        'max_error': float(errors.max()),
+        'latency_p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'latency_p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'fps': float(len(frames) / total_time) if total_time > 0 else None,
+    }
+
+
+def run_benchmark(names, image_dir=DATA_DIR, workers=None):
+    frames, angles = load_labeled_images(image_dir)
+    if len(frames) == 0:
+        raise RuntimeError('No labeled frames found in %s' % image_dir)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers or len(names), initializer=init_worker,
+                             initargs=(frames, angles)) as executor:
+        futures = [executor.submit(run_follower, name, FOLLOWERS[name][0], FOLLOWERS[name][1]) for name in names]
+        for future in futures:
+            results.append(future.result())
+    return results
+
+
+def print_table(results):
+    print('%-16s %7s %10s %10s %10s %10s %8s' % ('follower', 'frames', 'mean err', 'max err', 'p50 ms', 'p99 ms', 'fps'))
+    for row in results:
+        if 'error' in row:
+            print('%-16s failed: %s' % (row['follower'], row['error']))
+            continue
+        print('%-16s %7d %10.2f %10.2f %10.2f %10.2f %8.1f' % (
+            row['follower'], row['frames'], row['mean_error'], row['max_error'],
+            row['latency_p50_ms'], row['latency_p99_ms'], row['fps'] or 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lane followers on the labeled image set")
+    parser.add_argument("--images", help="Folder with labeled frames", type=str, default=DATA_DIR)
+    parser.add_argument("--followers", help="Followers to run (default: all)", nargs='*')
+    parser.add_argument("--variant", help="Extra end-to-end model, NAME=PATH", action='append', default=[])
+    parser.add_argument("--workers", help="Number of worker processes", type=int, default=None)
+    parser.add_argument("--json", help="Write results as JSON to this file", type=str, default=None)
+    args = parser.parse_args()
+
+    for variant in args.variant:
+        name, model_path = variant.split('=', 1)
+        register_follower(name, create_end_to_end_follower, model_path)
+
+    names = args.followers or list(FOLLOWERS)
+    unknown = [name for name in names if name not in FOLLOWERS]
+    if unknown:
+        parser.error('Unknown followers: %s (available: %s)' % (unknown, list(FOLLOWERS)))
+
+    results = run_benchmark(names, args.images, args.workers)
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        logging.info('Results written to %s' % args.json)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,207 @@
+"""
+Distill a small, fast lane model from lane_navigation.h5 (CPU only)
+
+The teacher (Nvidia model, 66x200 input) labels frames from the labeled image
+set and the recorded videos, a compact 80x160 student is trained on those
+labels, and the student is only written if it stays within the angle-error budget.
+
+Usage:
+python distill_lane_model.py
+python distill_lane_model.py --epochs 30 --max_error 4 --video_every_n 2
+"""
+
+import os
+
+os.environ['CUDA_VISIBLE_DEVICES'] = '-1'  # CPU only, also on machines with a GPU
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import argparse
+import glob
+import json
+import logging
+import sys
+import time
+
+import cv2
+import numpy as np
+from keras.models import Sequential, load_model
+from keras.layers import Conv2D, Dense, Flatten
+
+from lane_dataset import DATA_DIR, MODEL_DIR, img_preprocess, list_labeled_images, read_video_frames
+
+STUDENT_INPUT_SIZE = (160, 80)  # (width, height), test_raspberry_pi_optimization'daki boyut
+_RENDERED_VIDEO_SUFFIXES = ('_overlay.avi', '_end_to_end.avi')
+MIN_FRAMES = 2  # one training and one validation frame after the 80/20 split
+
+
+def build_student_model(input_size=STUDENT_INPUT_SIZE):
+    """Lightweight network sketched in tensorflow_test_linux.test_raspberry_pi_optimization"""
+    width, height = input_size
+    model = Sequential([
+        Conv2D(8, (5, 5), strides=(2, 2), activation='relu', input_shape=(height, width, 3)),
+        Conv2D(16, (3, 3), strides=(2, 2), activation='relu'),
+        Conv2D(24, (3, 3), strides=(2, 2), activation='relu'),
+        Flatten(),
+        Dense(50, activation='relu'),
+        Dense(1)
+    ])
+    model.compile(optimizer='adam', loss='mse')
+    return model
+
+
+def collect_frames(image_dir, video_every_n):
+    """Labeled frames (with ground truth) followed by unlabeled video frames (angle = nan)"""
+    frames = []
+    angles = []
+    for path, angle in list_labeled_images(image_dir):
+        frame = cv2.imread(path)
+        if frame is not None:
+            frames.append(frame)
+            angles.append(angle)
+
+    if video_every_n > 0:
+        for video_file in sorted(glob.glob(os.path.join(image_dir, '*.avi'))):
+            if video_file.endswith(_RENDERED_VIDEO_SUFFIXES):
+                continue  # overlay videos have heading lines drawn on them
+            video_frames = read_video_frames(video_file, every_n_frames=video_every_n)
+            frames.extend(video_frames)
+            angles.extend([np.nan] * len(video_frames))
+
+    return frames, np.asarray(angles, dtype=np.float32)
+
+
+def preprocess_all(frames, input_size):
+    return np.asarray([img_preprocess(frame, input_size) for frame in frames], dtype=np.float32)
+
+
+def measure_latency_ms(model, X, runs=50):
+    """Per-frame latency of model.predict with batch size 1, as EndToEndLaneFollower calls it"""
+    model.predict(X[:1])  # warm-up
+    latencies = []
+    for i in range(min(runs, len(X))):
+        start_time = time.time()
+        model.predict(X[i:i + 1])
+        latencies.append((time.time() - start_time) * 1000)
+    return float(np.median(latencies)), float(np.percentile(latencies, 99))
+
+
+def angle_errors(predicted, reference):
+    mask = ~np.isnan(reference)
+    if not mask.any():
+        return None, None
+    errors = np.abs(predicted[mask] - reference[mask])
+    return float(errors.mean()), float(errors.max())
+
+
+def distill(teacher_path, image_dir, output_path, epochs, batch_size, video_every_n, max_error, force):
+    logging.info('Loading teacher model: %s' % teacher_path)
+    teacher = load_model(teacher_path)
+    teacher_size = (teacher.input_shape[2], teacher.input_shape[1])
+
+    frames, ground_truth = collect_frames(image_dir, video_every_n)
+    logging.info('Collected %d frames (%d labeled)' % (len(frames), int((~np.isnan(ground_truth)).sum())))
+
+    # Split frames before augmenting, a frame and its mirror always land on the same side
+    rng = np.random.RandomState(0)
+    order = rng.permutation(len(frames))
+    split = int(len(order) * 0.8)
+    train_idx, valid_idx = order[:split], order[split:]
+    if len(train_idx) == 0 or len(valid_idx) == 0:
+        logging.error('%d frames found in %s, at least %d are needed for a training and a validation split'
+                      % (len(frames), image_dir, MIN_FRAMES))
+        return False
+
+    X_teacher = preprocess_all(frames, teacher_size)
+    X_student = preprocess_all(frames, STUDENT_INPUT_SIZE)
+    teacher_angles = teacher.predict(X_teacher, batch_size=64).reshape(-1)
+
+    # Flip augmentation of the training frames: mirrored frame, mirrored teacher angle
+    X_train = np.concatenate([X_student[train_idx], X_student[train_idx][:, :, ::-1, :]])
+    y_train = np.concatenate([teacher_angles[train_idx], 180.0 - teacher_angles[train_idx]])
+
+    student = build_student_model()
+    logging.info('Student model: %d parameters (teacher: %d)' % (student.count_params(), teacher.count_params()))
+    student.fit(X_train, y_train, batch_size=batch_size, epochs=epochs,
+                validation_data=(X_student[valid_idx], teacher_angles[valid_idx]), verbose=2)
+
+    # the budget is checked on held-out frames only
+    student_angles = student.predict(X_student[valid_idx], batch_size=64).reshape(-1)
+    vs_teacher_mean, vs_teacher_max = angle_errors(student_angles, teacher_angles[valid_idx])
+    teacher_gt_mean, teacher_gt_max = angle_errors(teacher_angles[valid_idx], ground_truth[valid_idx])
+    student_gt_mean, student_gt_max = angle_errors(student_angles, ground_truth[valid_idx])
+    teacher_p50, teacher_p99 = measure_latency_ms(teacher, X_teacher)
+    student_p50, student_p99 = measure_latency_ms(student, X_student)
+
+    report = {
+        'teacher': {'path': os.path.abspath(teacher_path), 'parameters': teacher.count_params(),
+                    'input_size': list(teacher_size), 'latency_p50_ms': teacher_p50, 'latency_p99_ms': teacher_p99,
+                    'ground_truth_mean_error': teacher_gt_mean, 'ground_truth_max_error': teacher_gt_max},
+        'student': {'path': os.path.abspath(output_path), 'parameters': student.count_params(),
+                    'input_size': list(STUDENT_INPUT_SIZE), 'latency_p50_ms': student_p50, 'latency_p99_ms': student_p99,
+                    'ground_truth_mean_error': student_gt_mean, 'ground_truth_max_error': student_gt_max,
+                    'teacher_mean_error': vs_teacher_mean, 'teacher_max_error': vs_teacher_max},
+        'frames': len(frames),
+        'validation_frames': len(valid_idx),
+        'max_error_budget': max_error,
+        'within_budget': vs_teacher_mean is not None and vs_teacher_mean <= max_error,
+    }
+    print_report(report)
+
+    report_path = os.path.splitext(output_path)[0] + '_report.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    logging.info('Report written to %s' % report_path)
+
+    if not report['within_budget'] and not force:
+        logging.error('Student mean error %.2f exceeds budget of %.2f degrees, model not written'
+                      % (vs_teacher_mean, max_error))
+        return False
+
+    student.save(output_path)
+    logging.info('Student model written to %s, use it with EndToEndLaneFollower(model_path=...)' % output_path)
+    return True
+
+
+def print_report(report):
+    def fmt(value):
+        return '-' if value is None else '%.2f' % value
+
+    rows = [
+        ('parameters', '%d' % report['teacher']['parameters'], '%d' % report['student']['parameters']),
+        ('input (w x h)', '%dx%d' % tuple(report['teacher']['input_size']), '%dx%d' % tuple(report['student']['input_size'])),
+        ('latency p50 ms', fmt(report['teacher']['latency_p50_ms']), fmt(report['student']['latency_p50_ms'])),
+        ('latency p99 ms', fmt(report['teacher']['latency_p99_ms']), fmt(report['student']['latency_p99_ms'])),
+        ('mean error vs label', fmt(report['teacher']['ground_truth_mean_error']), fmt(report['student']['ground_truth_mean_error'])),
+        ('max error vs label', fmt(report['teacher']['ground_truth_max_error']), fmt(report['student']['ground_truth_max_error'])),
+        ('mean error vs teacher', '-', fmt(report['student']['teacher_mean_error'])),
+        ('max error vs teacher', '-', fmt(report['student']['teacher_max_error'])),
+    ]
+    print('errors on %d held-out frames of %d' % (report['validation_frames'], report['frames']))
+    print('%-22s %12s %12s' % ('', 'teacher', 'student'))
+    for row in rows:
+        print('%-22s %12s %12s' % row)
+    print('within %.1f degree budget: %s' % (report['max_error_budget'], report['within_budget']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill a small lane model from lane_navigation.h5")
+    parser.add_argument("--teacher", help="Teacher model", type=str,
+                        default=os.path.join(MODEL_DIR, 'lane_navigation.h5'))
+    parser.add_argument("--images", help="Folder with labeled frames and recorded videos", type=str, default=DATA_DIR)
+    parser.add_argument("--output", help="Student model output path", type=str,
+                        default=os.path.join(MODEL_DIR, 'lane_navigation_student.h5'))
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--video_every_n", help="Use every n-th video frame, 0 disables videos", type=int, default=3)
+    parser.add_argument("--max_error", help="Mean angle error budget vs teacher, degrees", type=float, default=5.0)
+    parser.add_argument("--force", help="Write the student even if it is over budget", action='store_true')
+    args = parser.parse_args()
+
+    ok = distill(args.teacher, args.images, args.output, args.epochs, args.batch_size,
+                 args.video_every_n, args.max_error, args.force)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
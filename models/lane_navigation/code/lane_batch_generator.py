@@ -0,0 +1,262 @@
+"""
+Prefetching, multi-worker batch generator for training the lane model
+
+Decoding, img_preprocess and random augmentation (flip with angle mirroring,
+brightness, pan, zoom) run in worker processes; finished batches wait in a
+bounded prefetch queue, so model.fit on CPU is not starved by the input pipeline.
+
+The source is either a folder of labeled PNG frames or a packed dataset
+(packed_lane_dataset.py), which workers read through np.memmap.
+
+Usage:
+python lane_batch_generator.py                         # measure batches/s
+python lane_batch_generator.py --train --epochs 10     # train the Nvidia model
+python lane_batch_generator.py --pack ../data/lane.lanepack --workers 6
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from lane_dataset import DATA_DIR, MODEL_DIR, img_preprocess, list_labeled_images
+
+_STOP = None
+
+
+def zoom(image, rng, max_scale=1.3):
+    scale = rng.uniform(1.0, max_scale)
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), 0, scale)
+    return cv2.warpAffine(image, matrix, (width, height), borderMode=cv2.BORDER_REFLECT)
+
+
+def pan(image, rng, max_shift=0.1):
+    height, width = image.shape[:2]
+    dx = rng.uniform(-max_shift, max_shift) * width
+    dy = rng.uniform(-max_shift, max_shift) * height
+    matrix = np.float32([[1, 0, dx], [0, 1, dy]])
+    return cv2.warpAffine(image, matrix, (width, height), borderMode=cv2.BORDER_REFLECT)
+
+
+def adjust_brightness(image, rng, low=0.7, high=1.3):
+    return cv2.convertScaleAbs(image, alpha=rng.uniform(low, high))
+
+
+def flip(image, steering_angle):
+    # left <-> right, so the steering angle is mirrored around 90 (straight)
+    return cv2.flip(image, 1), 180 - steering_angle
+
+
+def random_augment(image, steering_angle, rng):
+    if rng.rand() < 0.5:
+        image = pan(image, rng)
+    if rng.rand() < 0.5:
+        image = zoom(image, rng)
+    if rng.rand() < 0.5:
+        image = adjust_brightness(image, rng)
+    if rng.rand() < 0.5:
+        image, steering_angle = flip(image, steering_angle)
+    return image, steering_angle
+
+
+class _FrameSource(object):
+    """Opened inside each worker: PNG paths are decoded, packs are memory-mapped"""
+
+    def __init__(self, pairs=None, pack_path=None):
+        if pack_path is not None:
+            from packed_lane_dataset import PackedLaneDataset
+            self.pack = PackedLaneDataset(pack_path)
+            self.angles = np.asarray(self.pack.angles, dtype=np.float32)
+        else:
+            self.pack = None
+            self.paths = [path for path, _ in pairs]
+            self.angles = np.asarray([angle for _, angle in pairs], dtype=np.float32)
+
+    def load(self, i):
+        if self.pack is not None:
+            return self.pack.frames[i]
+        return cv2.imread(self.paths[i])
+
+
+def _worker(pairs, pack_path, index_queue, batch_queue, augment, input_size, seed):
+    cv2.setNumThreads(1)  # parallelism comes from the worker processes
+    source = _FrameSource(pairs, pack_path)
+    rng = np.random.RandomState(seed)
+    while True:
+        indices = index_queue.get()
+        if indices is _STOP:
+            break
+        X = np.empty((len(indices), input_size[1], input_size[0], 3), dtype=np.float32)
+        y = np.empty((len(indices),), dtype=np.float32)
+        for j, i in enumerate(indices):
+            image, steering_angle = source.load(i), float(source.angles[i])
+            if augment:
+                image, steering_angle = random_augment(image, steering_angle, rng)
+            X[j] = img_preprocess(image, input_size)
+            y[j] = steering_angle
+        batch_queue.put((X, y))
+
+
+class LaneBatchGenerator(object):
+    """Endless (X, y) batch iterator, pass it to model.fit with steps_per_epoch"""
+
+    def __init__(self, image_dir=DATA_DIR, pack_path=None, batch_size=32, workers=4, prefetch=8,
+                 augment=True, input_size=(200, 66), indices=None, seed=None):
+        if pack_path is not None:
+            from packed_lane_dataset import PackedLaneDataset
+            pairs = None
+            count = len(PackedLaneDataset(pack_path))
+        else:
+            pairs = list_labeled_images(image_dir)
+            count = len(pairs)
+        if count == 0:
+            raise ValueError('No frames in %s' % (pack_path or image_dir))
+
+        self.indices = np.arange(count) if indices is None else np.asarray(indices)
+        self.batch_size = batch_size
+        self.steps_per_epoch = int(np.ceil(len(self.indices) / float(batch_size)))
+        self.rng = np.random.RandomState(seed)
+
+        self.index_queue = multiprocessing.Queue(maxsize=prefetch)
+        self.batch_queue = multiprocessing.Queue(maxsize=prefetch)
+        self.workers = []
+        for w in range(workers):
+            worker_seed = None if seed is None else seed + w + 1
+            process = multiprocessing.Process(target=_worker, args=(pairs, pack_path, self.index_queue, self.batch_queue,
+                                                                    augment, input_size, worker_seed))
+            process.daemon = True
+            process.start()
+            self.workers.append(process)
+
+        self.running = True
+        self.feeder = threading.Thread(target=self._feed)
+        self.feeder.daemon = True
+        self.feeder.start()
+        logging.info('LaneBatchGenerator: %d frames, %d workers, batch size %d'
+                     % (len(self.indices), workers, batch_size))
+
+    def _feed(self):
+        # shuffled index batches, one epoch after the other
+        while self.running:
+            order = self.rng.permutation(self.indices)
+            for start in range(0, len(order), self.batch_size):
+                while self.running:
+                    try:
+                        self.index_queue.put(order[start:start + self.batch_size], timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if not self.running:
+                    return
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.batch_queue.get()
+
+    next = __next__
+
+    def close(self):
+        self.running = False
+        self.feeder.join()
+        for _ in self.workers:
+            while True:
+                try:
+                    self.batch_queue.get_nowait()  # unblock workers waiting on a full queue
+                except queue.Empty:
+                    pass
+                try:
+                    self.index_queue.put(_STOP, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+        for process in self.workers:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _type, value, traceback):
+        self.close()
+
+
+def nvidia_model():
+    from keras.models import Sequential
+    from keras.layers import Conv2D, Dense, Dropout, Flatten
+    from keras.optimizers import Adam
+
+    model = Sequential([
+        Conv2D(24, (5, 5), strides=(2, 2), input_shape=(66, 200, 3), activation='elu'),
+        Conv2D(36, (5, 5), strides=(2, 2), activation='elu'),
+        Conv2D(48, (5, 5), strides=(2, 2), activation='elu'),
+        Conv2D(64, (3, 3), activation='elu'),
+        Dropout(0.2),
+        Conv2D(64, (3, 3), activation='elu'),
+        Flatten(),
+        Dropout(0.2),
+        Dense(100, activation='elu'),
+        Dense(50, activation='elu'),
+        Dense(10, activation='elu'),
+        Dense(1)
+    ])
+    model.compile(loss='mse', optimizer=Adam(1e-3))
+    return model
+
+
+def train(args):
+    if args.pack is not None:
+        from packed_lane_dataset import PackedLaneDataset
+        count = len(PackedLaneDataset(args.pack))
+    else:
+        count = len(list_labeled_images(args.images))
+    order = np.random.RandomState(0).permutation(count)
+    split = int(count * 0.8)
+
+    model = nvidia_model()
+    with LaneBatchGenerator(args.images, args.pack, args.batch_size, args.workers, indices=order[:split]) as train_batches, \
+            LaneBatchGenerator(args.images, args.pack, args.batch_size, 1, augment=False, indices=order[split:]) as valid_batches:
+        model.fit(train_batches, steps_per_epoch=train_batches.steps_per_epoch, epochs=args.epochs,
+                  validation_data=valid_batches, validation_steps=valid_batches.steps_per_epoch, verbose=2)
+    model.save(args.output)
+    logging.info('Model written to %s' % args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-worker lane training batch generator")
+    parser.add_argument("--images", help="Folder with labeled frames", type=str, default=DATA_DIR)
+    parser.add_argument("--pack", help="Packed dataset instead of PNG frames", type=str, default=None)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=max(1, multiprocessing.cpu_count() - 1))
+    parser.add_argument("--batches", help="Batches to time when not training", type=int, default=100)
+    parser.add_argument("--train", help="Train the Nvidia model with the generator", action='store_true')
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--output", type=str, default=os.path.join(MODEL_DIR, 'lane_navigation_check.h5'))
+    args = parser.parse_args()
+
+    if args.train:
+        train(args)
+        return
+
+    with LaneBatchGenerator(args.images, args.pack, args.batch_size, args.workers) as batches:
+        next(batches)  # workers started
+        start_time = time.time()
+        for _ in range(args.batches):
+            X, y = next(batches)
+        elapsed = time.time() - start_time
+    print('%d batches of %s in %.2fs: %.1f batches/s, %.0f frames/s'
+          % (args.batches, X.shape, elapsed, args.batches / elapsed, args.batches * len(X) / elapsed))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
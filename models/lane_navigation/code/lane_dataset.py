@@ -0,0 +1,91 @@
+"""
+Lane navigation dataset helpers
+
+Labeled frames are written by save_training_data.py as
+    <video>_<frame index>_<steering angle>.png   e.g. video01_012_085.png
+"""
+
+import glob
+import logging
+import os
+import re
+
+import cv2
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'images')
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'model_result')
+
+_LABELED_FILENAME = re.compile(r'^(?P<video>.+)_(?P<index>\d{3,})_(?P<angle>\d{3})\.png$')
+
+
+def parse_steering_angle(filename):
+    """Steering angle encoded in a labeled frame filename, None if it is not a labeled frame"""
+    match = _LABELED_FILENAME.match(os.path.basename(filename))
+    if match is None:
+        return None
+    return int(match.group('angle'))
+
+
+def list_labeled_images(directory=DATA_DIR):
+    """Sorted (path, steering angle) pairs of all labeled frames in a directory"""
+    pairs = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.png'))):
+        angle = parse_steering_angle(path)
+        if angle is not None:
+            pairs.append((path, angle))
+    return pairs
+
+
+def load_labeled_images(directory=DATA_DIR):
+    """All labeled frames as one uint8 array (N, H, W, 3) plus their angles (N,)"""
+    pairs = list_labeled_images(directory)
+    frames = []
+    angles = []
+    for path, angle in pairs:
+        frame = cv2.imread(path)
+        if frame is None:
+            logging.warning('Could not read %s, skipping' % path)
+            continue
+        frames.append(frame)
+        angles.append(angle)
+    logging.info('Loaded %d labeled frames from %s' % (len(frames), directory))
+    if not frames:
+        return np.zeros((0, 0, 0, 3), dtype=np.uint8), np.zeros((0,), dtype=np.float32)
+    return np.stack(frames), np.asarray(angles, dtype=np.float32)
+
+
+def read_video_frames(video_file, every_n_frames=1, max_frames=None):
+    """Frames of a recorded video, keeping every n-th frame"""
+    cap = cv2.VideoCapture(video_file)
+    frames = []
+    try:
+        i = 0
+        while cap.isOpened():
+            if i % every_n_frames != 0:
+                if not cap.grab():
+                    break
+            else:
+                _, frame = cap.read()
+                if frame is None:
+                    break
+                frames.append(frame)
+                if max_frames is not None and len(frames) >= max_frames:
+                    break
+            i += 1
+    finally:
+        cap.release()
+    logging.info('Read %d frames from %s' % (len(frames), video_file))
+    return frames
+
+
+def img_preprocess(image, size=(200, 66)):
+    """Nvidia model preprocessing, shared by training, distillation and EndToEndLaneFollower
+    size -- (width, height) of the model input
+    """
+    height = image.shape[0]
+    image = image[int(height / 2):, :, :]  # remove top half of the image, as it is not relevant for lane following
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2YUV)  # Nvidia model said it is best to use YUV color space
+    image = cv2.GaussianBlur(image, (3, 3), 0)
+    image = cv2.resize(image, size)
+    return image.astype(np.float32) / 255.0
@@ -0,0 +1,204 @@
+"""
+Packed lane dataset: all frames in one contiguous uint8 file, readable with np.memmap
+
+A pack is a directory:
+    header.json  format version, frame shape, frame count, source names
+    frames.u8    count x H x W x 3 uint8 (BGR, as cv2.imread returns it)
+    meta.bin     count records of META_DTYPE (steering angle, source id, frame index)
+
+Opening a pack costs two mmaps instead of one open + PNG decode per frame.
+New recordings can be appended; the header is written last, so an interrupted
+append leaves the pack readable with its previous frame count. Rewriting a pack
+resets its header to 0 frames before the data files are truncated.
+
+Usage:
+python packed_lane_dataset.py pack ../data/images -o ../data/lane.lanepack
+python packed_lane_dataset.py pack /path/to/car_video_new.avi -o ../data/lane.lanepack --append
+python packed_lane_dataset.py info ../data/lane.lanepack
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'driver', 'code'))
+
+from lane_dataset import list_labeled_images
+
+FORMAT_VERSION = 1
+META_DTYPE = np.dtype([('angle', '<f4'), ('source', '<u2'), ('frame_index', '<i4')])
+_DECODE_THREADS = 4
+
+
+class PackedLaneDataset(object):
+    """Read-only, zero-copy view of a pack"""
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        count = self.header['count']
+        shape = tuple(self.header['frame_shape'] or ())  # None until the first frame of a new pack
+        if count == 0:
+            self.frames = np.zeros((0,) + shape, dtype=np.uint8)
+            self.meta = np.zeros((0,), dtype=META_DTYPE)
+        else:
+            self.frames = np.memmap(os.path.join(path, 'frames.u8'), dtype=np.uint8, mode='r', shape=(count,) + shape)
+            self.meta = np.memmap(os.path.join(path, 'meta.bin'), dtype=META_DTYPE, mode='r', shape=(count,))
+
+    @property
+    def angles(self):
+        return self.meta['angle']
+
+    @property
+    def sources(self):
+        return self.header['sources']
+
+    def __len__(self):
+        return self.header['count']
+
+    def __getitem__(self, i):
+        return self.frames[i], float(self.meta[i]['angle'])
+
+
+class PackedLaneDatasetWriter(object):
+
+    def __init__(self, path, frame_shape=None, append=False):
+        self.path = path
+        if append and os.path.exists(os.path.join(path, 'header.json')):
+            self.header = read_header(path)
+            if frame_shape is not None and tuple(frame_shape) != tuple(self.header['frame_shape']):
+                raise ValueError('Frame shape %s does not match pack %s' % (frame_shape, self.header['frame_shape']))
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.header = {'format_version': FORMAT_VERSION, 'frame_shape': list(frame_shape) if frame_shape else None,
+                           'count': 0, 'sources': []}
+            # the old header must not outlive the frames truncated below if this run is interrupted
+            write_header(path, self.header)
+
+        # drop anything past the header count (left over from an interrupted append)
+        frame_bytes = int(np.prod(self.header['frame_shape'])) if self.header['frame_shape'] else 0
+        self.frames_file = open(os.path.join(path, 'frames.u8'), 'ab')
+        self.frames_file.truncate(self.header['count'] * frame_bytes)
+        self.meta_file = open(os.path.join(path, 'meta.bin'), 'ab')
+        self.meta_file.truncate(self.header['count'] * META_DTYPE.itemsize)
+
+    def source_id(self, name):
+        if name not in self.header['sources']:
+            self.header['sources'].append(name)
+        return self.header['sources'].index(name)
+
+    def add(self, frame, angle, source, frame_index):
+        if self.header['frame_shape'] is None:
+            self.header['frame_shape'] = list(frame.shape)
+        if list(frame.shape) != self.header['frame_shape']:
+            raise ValueError('Frame %s of %s has shape %s, pack has %s'
+                             % (frame_index, source, frame.shape, self.header['frame_shape']))
+        record = np.array([(angle, self.source_id(source), frame_index)], dtype=META_DTYPE)
+        self.frames_file.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        self.meta_file.write(record.tobytes())
+        self.header['count'] += 1
+
+    def close(self):
+        self.frames_file.close()
+        self.meta_file.close()
+        write_header(self.path, self.header)
+        logging.info('Pack %s: %d frames of %s' % (self.path, self.header['count'], self.header['frame_shape']))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _type, value, traceback):
+        self.close()
+
+
+def read_header(path):
+    with open(os.path.join(path, 'header.json'), 'r') as f:
+        header = json.load(f)
+    if header.get('format_version') != FORMAT_VERSION:
+        raise ValueError('Unsupported pack version: %s' % header.get('format_version'))
+    return header
+
+
+def write_header(path, header):
+    tmp_path = os.path.join(path, 'header.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(header, f, indent=2)
+    os.replace(tmp_path, os.path.join(path, 'header.json'))
+
+
+def pack_image_folder(writer, directory):
+    """Labeled PNG frames, decoded on a thread pool and written in filename order"""
+    pairs = list_labeled_images(directory)
+    source = os.path.basename(os.path.normpath(directory))
+    with ThreadPoolExecutor(max_workers=_DECODE_THREADS) as pool:
+        for i, ((path, angle), frame) in enumerate(zip(pairs, pool.map(cv2.imread, [p for p, _ in pairs]))):
+            if frame is None:
+                logging.warning('Could not read %s, skipping' % path)
+                continue
+            writer.add(frame, angle, source, i)
+    return len(pairs)
+
+
+def pack_video(writer, video_file):
+    """Video frames, labeled with the hand-coded lane follower in steering-only mode"""
+    from hand_coded_lane_follower_test_windows import HandCodedLaneFollower
+    lane_follower = HandCodedLaneFollower()
+    source = os.path.basename(video_file)
+    cap = cv2.VideoCapture(video_file)
+    i = 0
+    try:
+        while cap.isOpened():
+            _, frame = cap.read()
+            if frame is None:
+                break
+            lane_follower.compute_steering(frame)
+            writer.add(frame, lane_follower.curr_steering_angle, source, i)
+            i += 1
+    finally:
+        cap.release()
+    return i
+
+
+def pack(inputs, output, append=False):
+    with PackedLaneDatasetWriter(output, append=append) as writer:
+        for path in inputs:
+            if os.path.isdir(path):
+                count = pack_image_folder(writer, path)
+            else:
+                count = pack_video(writer, path)
+            logging.info('Packed %d frames from %s' % (count, path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packed, memory-mapped lane dataset")
+    subparsers = parser.add_subparsers(dest='command')
+    pack_parser = subparsers.add_parser('pack', help='Pack image folders and/or videos')
+    pack_parser.add_argument('inputs', nargs='+', help='Folders with labeled PNG frames or .avi videos')
+    pack_parser.add_argument('-o', '--output', required=True, help='Pack directory')
+    pack_parser.add_argument('--append', action='store_true', help='Append to an existing pack')
+    info_parser = subparsers.add_parser('info', help='Show pack contents')
+    info_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        pack(args.inputs, args.output, args.append)
+    elif args.command == 'info':
+        dataset = PackedLaneDataset(args.path)
+        angles = dataset.angles
+        print('%s: %d frames of %s' % (args.path, len(dataset), dataset.header['frame_shape']))
+        print('sources: %s' % dataset.sources)
+        if len(dataset):
+            print('steering angle: min=%.0f mean=%.1f max=%.0f' % (angles.min(), angles.mean(), angles.max()))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,157 @@
+"""
+Near-duplicate frame pruning for recorded driving datasets
+
+Straight sections and stops produce long runs of almost identical frames.
+Every frame gets a 64-bit difference hash (dHash), computed in parallel;
+a frame is dropped when an already kept frame is within --max_distance bits
+and --max_angle_diff degrees of it.
+
+Candidates are found with a banded index instead of comparing all pairs: the
+hash is split into max_distance + 1 bands, and two hashes within max_distance
+bits must agree on at least one band (pigeonhole), so only frames sharing a
+band value are compared.
+
+Usage:
+python prune_duplicate_frames.py ../data/images --manifest pruned.json
+python prune_duplicate_frames.py ../data/lane.lanepack --output ../data/lane_pruned.lanepack --max_distance 4
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'driver', 'code'))
+
+from image_hash import dhash, hamming_distance
+from lane_dataset import list_labeled_images
+from packed_lane_dataset import PackedLaneDataset, PackedLaneDatasetWriter
+
+_HASH_CHUNK = 256
+
+
+def _hash_paths(paths):
+    return [dhash(cv2.imread(path)) for path in paths]
+
+
+def _hash_pack_range(pack_path, start, end):
+    frames = PackedLaneDataset(pack_path).frames
+    return [dhash(frames[i]) for i in range(start, end)]
+
+
+def compute_hashes(paths=None, pack_path=None, count=0, workers=None):
+    """dHash of every frame, chunks are spread over a process pool"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if pack_path is not None:
+            chunks = [pool.submit(_hash_pack_range, pack_path, start, min(start + _HASH_CHUNK, count))
+                      for start in range(0, count, _HASH_CHUNK)]
+        else:
+            chunks = [pool.submit(_hash_paths, paths[start:start + _HASH_CHUNK])
+                      for start in range(0, len(paths), _HASH_CHUNK)]
+        hashes = []
+        for chunk in chunks:
+            hashes.extend(chunk.result())
+    return np.asarray(hashes, dtype=np.uint64)
+
+
+def band_keys(hashes, bands):
+    """(N, bands) band values of every hash, bands are contiguous bit ranges"""
+    bounds = np.linspace(0, 64, bands + 1).astype(int)
+    keys = np.empty((len(hashes), bands), dtype=np.uint64)
+    for b in range(bands):
+        width = bounds[b + 1] - bounds[b]
+        mask = np.uint64((1 << width) - 1)
+        keys[:, b] = (hashes >> np.uint64(bounds[b])) & mask
+    return keys
+
+
+def find_duplicates(hashes, angles, max_distance=3, max_angle_diff=2.0):
+    """For every frame, index of the kept frame it duplicates, or -1 if it is kept"""
+    if not 0 <= max_distance < 8:
+        raise ValueError('max_distance must be between 0 and 7')
+    bands = max_distance + 1
+    keys = band_keys(hashes, bands)
+    buckets = [dict() for _ in range(bands)]  # band value -> kept frame indices
+    duplicate_of = np.full(len(hashes), -1, dtype=np.int64)
+
+    for i in range(len(hashes)):
+        candidates = set()
+        for b in range(bands):
+            candidates.update(buckets[b].get(keys[i, b], ()))
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64)
+            close = (hamming_distance(hashes[i], hashes[candidates]) <= max_distance) & \
+                    (np.abs(angles[candidates] - angles[i]) <= max_angle_diff)
+            if close.any():
+                duplicate_of[i] = candidates[close].min()
+                continue
+        for b in range(bands):
+            buckets[b].setdefault(keys[i, b], []).append(i)
+    return duplicate_of
+
+
+def write_manifest(path, names, duplicate_of, settings):
+    kept = np.flatnonzero(duplicate_of < 0)
+    manifest = {
+        'settings': settings,
+        'total': len(names),
+        'kept': len(kept),
+        'kept_frames': [names[i] for i in kept],
+        'duplicates': dict((names[i], names[duplicate_of[i]]) for i in np.flatnonzero(duplicate_of >= 0)),
+    }
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    logging.info('Manifest written to %s' % path)
+
+
+def write_pruned_pack(output, source, load_frame, angles, duplicate_of):
+    """Kept frames into a new pack, frame_index is the index in the input dataset"""
+    with PackedLaneDatasetWriter(output) as writer:
+        for i in np.flatnonzero(duplicate_of < 0):
+            writer.add(load_frame(i), float(angles[i]), source, int(i))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prune near-duplicate frames")
+    parser.add_argument("input", help="Folder with labeled frames or a packed dataset")
+    parser.add_argument("--max_distance", help="Max dHash bit distance of a duplicate (0-7)", type=int, default=3)
+    parser.add_argument("--max_angle_diff", help="Max steering angle difference of a duplicate", type=float, default=2.0)
+    parser.add_argument("--manifest", help="Write kept/duplicate frames as JSON", type=str, default=None)
+    parser.add_argument("--output", help="Write kept frames into a new packed dataset", type=str, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if os.path.exists(os.path.join(args.input, 'header.json')):
+        dataset = PackedLaneDataset(args.input)
+        angles = np.asarray(dataset.angles, dtype=np.float32)
+        names = ['%s:%d' % (dataset.sources[m['source']], m['frame_index']) for m in dataset.meta]
+        hashes = compute_hashes(pack_path=args.input, count=len(dataset), workers=args.workers)
+        load_frame = lambda i: dataset.frames[i]
+    else:
+        pairs = list_labeled_images(args.input)
+        paths = [path for path, _ in pairs]
+        angles = np.asarray([angle for _, angle in pairs], dtype=np.float32)
+        names = [os.path.basename(path) for path in paths]
+        hashes = compute_hashes(paths=paths, workers=args.workers)
+        load_frame = lambda i: cv2.imread(paths[i])
+
+    duplicate_of = find_duplicates(hashes, angles, args.max_distance, args.max_angle_diff)
+    kept = int((duplicate_of < 0).sum())
+    print('%d frames, %d kept, %d near-duplicates removed (%.0f%%)'
+          % (len(hashes), kept, len(hashes) - kept, 100.0 * (len(hashes) - kept) / max(1, len(hashes))))
+
+    settings = {'max_distance': args.max_distance, 'max_angle_diff': args.max_angle_diff}
+    if args.manifest:
+        write_manifest(args.manifest, names, duplicate_of, settings)
+    if args.output:
+        write_pruned_pack(args.output, os.path.basename(os.path.normpath(args.input)), load_frame, angles, duplicate_of)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,131 @@
+"""
+Incremental annotation index for labelImg XML files
+
+Parsed boxes are cached in a SQLite file keyed by XML path and mtime, so only
+new or changed files are parsed again. Large batches of changed files are
+parsed on a process pool. One index_file can be shared by several folders,
+each index only sees and cleans up the XML files of its own folder.
+
+Usage:
+python annotation_index.py [PATH_TO_IMAGES_FOLDER]/train
+"""
+
+import glob
+import logging
+import os
+import sqlite3
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_INDEX_NAME = ".annotation_index.sqlite"
+_PARALLEL_MIN_FILES = 64  # smaller batches are parsed in process, a pool costs more than it saves
+_PARSE_CHUNK = 32
+
+
+def parse_annotation(xml_file):
+    """Boxes of one labelImg file, rows in xml_to_csv column order"""
+    root = ET.parse(xml_file).getroot()
+    filename = root.find("filename").text
+    width = int(root.find("size")[0].text)
+    height = int(root.find("size")[1].text)
+    rows = []
+    for member in root.findall("object"):
+        rows.append(
+            (
+                filename,
+                width,
+                height,
+                member[0].text,
+                int(member[4][0].text),
+                int(member[4][1].text),
+                int(member[4][2].text),
+                int(member[4][3].text),
+            )
+        )
+    return rows
+
+
+def _parse_chunk(xml_files):
+    return [(xml_file, parse_annotation(xml_file)) for xml_file in xml_files]
+
+
+class AnnotationIndex(object):
+    def __init__(self, path, index_file=None):
+        self.path = path
+        self.directory = os.path.abspath(path)
+        self.index_file = index_file or os.path.join(path, DEFAULT_INDEX_NAME)
+        self.db = sqlite3.connect(self.index_file)
+        self.db.create_function("dirname", 1, os.path.dirname)
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (xml_path TEXT PRIMARY KEY, mtime REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS boxes (
+                xml_path TEXT NOT NULL, filename TEXT, width INTEGER, height INTEGER, class TEXT,
+                xmin INTEGER, ymin INTEGER, xmax INTEGER, ymax INTEGER);
+            CREATE INDEX IF NOT EXISTS boxes_xml_path ON boxes (xml_path);
+            """
+        )
+
+    def update(self, workers=None):
+        """Re-parse new and changed XML files, drop deleted ones. Returns (parsed, removed)"""
+        current = {}
+        for xml_file in glob.glob(os.path.join(self.path, "*.xml")):
+            current[os.path.abspath(xml_file)] = os.path.getmtime(xml_file)
+        known = dict(
+            self.db.execute("SELECT xml_path, mtime FROM files WHERE dirname(xml_path) = ?", (self.directory,))
+        )
+
+        removed = [p for p in known if p not in current]
+        changed = sorted(p for p, mtime in current.items() if known.get(p) != mtime)
+
+        if len(changed) >= _PARALLEL_MIN_FILES:
+            chunks = [changed[i:i + _PARSE_CHUNK] for i in range(0, len(changed), _PARSE_CHUNK)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parsed = [item for chunk in pool.map(_parse_chunk, chunks) for item in chunk]
+        else:
+            parsed = _parse_chunk(changed)
+
+        with self.db:
+            for xml_path in removed + changed:
+                self.db.execute("DELETE FROM boxes WHERE xml_path = ?", (xml_path,))
+                self.db.execute("DELETE FROM files WHERE xml_path = ?", (xml_path,))
+            for xml_path, rows in parsed:
+                self.db.executemany(
+                    "INSERT INTO boxes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(xml_path,) + row for row in rows],
+                )
+                self.db.execute("INSERT INTO files VALUES (?, ?)", (xml_path, current[xml_path]))
+
+        logging.info(
+            "Annotation index %s: %d files, %d parsed, %d removed"
+            % (self.index_file, len(current), len(parsed), len(removed))
+        )
+        return len(parsed), len(removed)
+
+    def rows(self):
+        """All boxes of the folder in xml_to_csv column order, grouped by XML file"""
+        return self.db.execute(
+            "SELECT filename, width, height, class, xmin, ymin, xmax, ymax FROM boxes"
+            " WHERE dirname(xml_path) = ? ORDER BY xml_path, rowid",
+            (self.directory,),
+        ).fetchall()
+
+    def class_names(self):
+        return [
+            name
+            for (name,) in self.db.execute(
+                "SELECT DISTINCT class FROM boxes WHERE dirname(xml_path) = ? ORDER BY class", (self.directory,)
+            )
+        ]
+
+    def close(self):
+        self.db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    index = AnnotationIndex(sys.argv[1] if len(sys.argv) > 1 else os.getcwd())
+    index.update()
+    print("%d boxes, classes: %s" % (len(index.rows()), index.class_names()))
+    index.close()
@@ -0,0 +1,172 @@
+"""
+Box statistics and anchor fitting for the labels CSVs of xml_to_csv.py
+
+Per class: size, aspect ratio and position distributions of the boxes,
+computed for all classes at once with np.bincount over (class, bin) pairs.
+Box shapes are clustered with k-means on 1 - IoU to suggest SSD anchor
+aspect ratios and scales, and a `min_height_pct` per class is suggested for
+TrafficObject.is_close_by (a low quantile of the relative box height, so most
+labeled instances count as close).
+
+Usage:
+python box_statistics.py [PATH_TO_ANNOTATIONS_FOLDER]/train_labels.csv [PATH_TO_ANNOTATIONS_FOLDER]/test_labels.csv
+python box_statistics.py [PATH_TO_ANNOTATIONS_FOLDER]/train_labels.csv --anchors 6 --json box_stats.json
+"""
+
+import argparse
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+
+HISTOGRAM_RANGES = {
+    "width": (0.0, 1.0),
+    "height": (0.0, 1.0),
+    "aspect": (0.0, 4.0),  # width / height
+    "center_x": (0.0, 1.0),
+    "center_y": (0.0, 1.0),
+}
+
+
+def load_boxes(csv_paths):
+    """Boxes of the CSVs as NumPy arrays, sizes and positions relative to the image"""
+    df = pd.concat([pd.read_csv(path) for path in csv_paths], ignore_index=True)
+    classes, class_ids = np.unique(df["class"].values.astype(str), return_inverse=True)
+    image_w = df["width"].values.astype(np.float64)
+    image_h = df["height"].values.astype(np.float64)
+    xmin, ymin = df["xmin"].values / image_w, df["ymin"].values / image_h
+    xmax, ymax = df["xmax"].values / image_w, df["ymax"].values / image_h
+    width, height = xmax - xmin, ymax - ymin
+    valid = (width > 0) & (height > 0)
+    if not valid.all():
+        logging.warning("Skipping %d boxes with zero or negative size" % (~valid).sum())
+    boxes = {
+        "class_id": class_ids,
+        "width": width,
+        "height": height,
+        "aspect": width / np.where(height > 0, height, 1),
+        "center_x": (xmin + xmax) / 2,
+        "center_y": (ymin + ymax) / 2,
+    }
+    return list(classes), dict((name, values[valid]) for name, values in boxes.items())
+
+
+def class_histograms(boxes, num_classes, bins=20):
+    """{stat: (num_classes, bins) counts}, values outside the range go to the edge bins"""
+    histograms = {}
+    for stat, (low, high) in HISTOGRAM_RANGES.items():
+        bin_index = np.clip(((boxes[stat] - low) / (high - low) * bins).astype(np.int64), 0, bins - 1)
+        flat = np.bincount(boxes["class_id"] * bins + bin_index, minlength=num_classes * bins)
+        histograms[stat] = flat.reshape(num_classes, bins)
+    return histograms
+
+
+def class_quantiles(values, class_ids, num_classes, quantiles):
+    """(num_classes, len(quantiles)) quantiles of values per class, from one sort"""
+    order = np.lexsort((values, class_ids))
+    sorted_values = values[order]
+    counts = np.bincount(class_ids, minlength=num_classes)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = starts[:, None] + np.floor(np.outer(np.maximum(counts - 1, 0), quantiles)).astype(np.int64)
+    result = sorted_values[np.minimum(positions, len(sorted_values) - 1)] if len(sorted_values) else \
+        np.zeros(positions.shape)
+    result[counts == 0] = np.nan
+    return result
+
+
+def shape_iou(shapes, anchors):
+    """(N, k) IoU of (w, h) shapes and anchors placed on the same center"""
+    intersection = np.minimum(shapes[:, None, 0], anchors[None, :, 0]) * \
+        np.minimum(shapes[:, None, 1], anchors[None, :, 1])
+    union = (shapes[:, 0] * shapes[:, 1])[:, None] + (anchors[:, 0] * anchors[:, 1])[None, :] - intersection
+    return intersection / union
+
+
+def kmeans_anchors(shapes, k=6, iterations=100, seed=0, max_shapes=50000):
+    """k (w, h) anchors minimizing 1 - IoU, sorted by area, and the mean best IoU
+
+    Larger datasets are fitted on a random sample of max_shapes boxes, which
+    changes the anchors by far less than their spread.
+    """
+    rng = np.random.RandomState(seed)
+    if max_shapes and len(shapes) > max_shapes:
+        shapes = shapes[rng.choice(len(shapes), max_shapes, replace=False)]
+    k = min(k, len(shapes))
+    anchors = shapes[rng.choice(len(shapes), k, replace=False)]
+    assignment = None
+    for _ in range(iterations):
+        new_assignment = np.argmax(shape_iou(shapes, anchors), axis=1)
+        if assignment is not None and np.array_equal(new_assignment, assignment):
+            break
+        assignment = new_assignment
+        counts = np.bincount(assignment, minlength=k)
+        for dim in range(2):
+            sums = np.bincount(assignment, weights=shapes[:, dim], minlength=k)
+            anchors[:, dim] = np.where(counts > 0, sums / np.maximum(counts, 1), anchors[:, dim])
+    anchors = anchors[np.argsort(anchors[:, 0] * anchors[:, 1])]
+    return anchors, float(shape_iou(shapes, anchors).max(axis=1).mean())
+
+
+def suggest_min_height_pct(boxes, num_classes, quantile=0.25):
+    """Per class: relative box height that `quantile` of the labeled instances are below"""
+    return class_quantiles(boxes["height"], boxes["class_id"], num_classes, [quantile])[:, 0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Box statistics and anchor fitting over labels CSVs")
+    parser.add_argument("csv", nargs="+", help="Labels CSVs written by xml_to_csv.py")
+    parser.add_argument("--bins", type=int, default=20)
+    parser.add_argument("--anchors", help="Number of k-means anchors", type=int, default=6)
+    parser.add_argument("--anchor_sample", help="Boxes used for anchor fitting (0: all)", type=int, default=50000)
+    parser.add_argument("--close_quantile", help="Quantile of box heights used for min_height_pct", type=float,
+                        default=0.25)
+    parser.add_argument("--json", help="Write all statistics, including histograms, to a JSON file", type=str,
+                        default=None)
+    args = parser.parse_args()
+
+    classes, boxes = load_boxes(args.csv)
+    num_classes = len(classes)
+    counts = np.bincount(boxes["class_id"], minlength=num_classes)
+    histograms = class_histograms(boxes, num_classes, args.bins)
+    quantiles = [0.05, 0.5, 0.95]
+    stats = dict((stat, class_quantiles(boxes[stat], boxes["class_id"], num_classes, quantiles))
+                 for stat in ("width", "height", "aspect"))
+    min_height_pct = suggest_min_height_pct(boxes, num_classes, args.close_quantile)
+
+    print("%d boxes, %d classes (sizes relative to the image, p5/p50/p95)" % (len(boxes["class_id"]), num_classes))
+    print("%-22s %7s %17s %17s %17s %15s" % ("class", "boxes", "width", "height", "aspect w/h", "min_height_pct"))
+    for i, name in enumerate(classes):
+        print("%-22s %7d %17s %17s %17s %15.3f" % (
+            name, counts[i],
+            "/".join("%.2f" % v for v in stats["width"][i]),
+            "/".join("%.2f" % v for v in stats["height"][i]),
+            "/".join("%.2f" % v for v in stats["aspect"][i]),
+            min_height_pct[i]))
+
+    shapes = np.stack([boxes["width"], boxes["height"]], axis=1)
+    anchors, mean_iou = kmeans_anchors(shapes, args.anchors, max_shapes=args.anchor_sample)
+    print("\n%d anchors, mean best IoU %.3f" % (len(anchors), mean_iou))
+    print("%8s %8s %8s %8s" % ("width", "height", "scale", "aspect"))
+    for w, h in anchors:
+        print("%8.3f %8.3f %8.3f %8.2f" % (w, h, np.sqrt(w * h), w / h))
+
+    if args.json:
+        report = {
+            "classes": classes,
+            "counts": counts.tolist(),
+            "histogram_ranges": HISTOGRAM_RANGES,
+            "histograms": dict((stat, h.tolist()) for stat, h in histograms.items()),
+            "quantiles": quantiles,
+            "quantile_values": dict((stat, np.nan_to_num(v).tolist()) for stat, v in stats.items()),
+            "min_height_pct": dict(zip(classes, np.nan_to_num(min_height_pct).tolist())),
+            "anchors": {"wh": anchors.tolist(), "mean_iou": mean_iou},
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info("Statistics written to %s" % args.json)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
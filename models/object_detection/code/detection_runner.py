@@ -0,0 +1,231 @@
+"""
+Shared camera -> EdgeTPU detection loop of coco_object_detection.py and object_detection_usb.py
+
+One camera.read() per frame. The frame is resized to the model input keeping its
+aspect ratio and padded at the bottom or right, like DetectWithImage(keep_aspect_ratio=True)
+did (--stretch fills the whole input instead). Buffers are reused across frames and
+the RGB data goes to DetectWithInputTensor as raw uint8 (no PIL). Boxes come back
+relative to the input tensor and are mapped to new result objects in frame pixels.
+With --roi crop or --roi tile only the sign band of the frame (driver/code
+detection_regions.py) goes to the detector, as one crop or as overlapping
+tiles of about the input size whose detections are merged with NMS; small
+distant signs keep more input pixels than with the whole frame squeezed in.
+With --gate a scene change test (driver/code detection_gate.py) skips the
+detector on frames with nothing new and reuses the last detections.
+Detections are recorded as per-frame metadata and only drawn (driver/code
+detection_annotator.py, cached label sprites) when the frame is shown or written.
+
+Usage:
+python detection_runner.py --model data/model_result/road_signs_quantized.tflite --label data/model_result/road_sign_labels.txt
+python detection_runner.py --replay --video /path/to/car_video.avi     # no EdgeTPU, see replay_detection_engine.py
+python detection_runner.py --roi tile                                   # 3 detector calls per frame on the sign band
+python detection_runner.py --gate                                       # detect only on scene changes, 1/s at least
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import sys
+import time
+import traceback
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "driver", "code"))
+from detection_annotator import DetectionAnnotator
+from detection_batch import DetectedObject
+from detection_gate import DetectionGate
+from detection_regions import DetectionRegions
+
+IM_WIDTH = 640
+IM_HEIGHT = 480
+
+
+def load_labels(label_file):
+    with open(label_file, 'r') as f:
+        pairs = (l.strip().split(maxsplit=1) for l in f.readlines() if l.strip())
+        return dict((int(k), v) for k, v in pairs)
+
+
+class DetectionRunner(object):
+
+    def __init__(self, engine, labels, min_confidence=0.20, top_k=5, regions=None, keep_aspect_ratio=True):
+        self.engine = engine
+        self.labels = labels
+        self.min_confidence = min_confidence
+        self.top_k = top_k
+        _, height, width, _ = engine.get_input_tensor_shape()
+        self.input_size = (int(width), int(height))
+        self.input_tensor = np.zeros((height, width, 3), dtype=np.uint8)
+        self.flat_input = self.input_tensor.reshape(-1)  # view, filled below
+        # like DetectWithImage(keep_aspect_ratio=True): scaled to fit, padded at the bottom or right
+        self.keep_aspect_ratio = keep_aspect_ratio
+        self.image_size = None
+        self.content_size = None
+        self.resized = None
+        self.rgb = None
+        # optional DetectionRegions, None feeds the whole frame
+        self.regions = regions
+
+        # drawing
+        self.annotator = DetectionAnnotator(labels)
+
+    def fit(self, image_size):
+        """Buffers for an image size, reused until the size changes"""
+        width, height = image_size
+        if self.keep_aspect_ratio:
+            scale = min(self.input_size[0] / float(width), self.input_size[1] / float(height))
+            self.content_size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        else:
+            self.content_size = self.input_size
+        self.resized = np.empty((self.content_size[1], self.content_size[0], 3), dtype=np.uint8)
+        self.rgb = np.empty_like(self.resized)
+        self.input_tensor[...] = 0
+        self.image_size = image_size
+
+    def detect_input(self, image):
+        """
+        Engine results of a BGR image fed into the input tensor, as (label_ids, scores, boxes)
+        boxes are (N, 4) relative to the image; the engine's result objects are not changed
+        """
+        image_size = (image.shape[1], image.shape[0])
+        if image_size != self.image_size:
+            self.fit(image_size)
+        cv2.resize(image, self.content_size, dst=self.resized, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        self.input_tensor[:self.content_size[1], :self.content_size[0]] = self.rgb
+        results = self.engine.DetectWithInputTensor(self.flat_input, threshold=self.min_confidence, top_k=self.top_k)
+
+        label_ids = np.array([obj.label_id for obj in results], dtype=np.int32)
+        scores = np.array([obj.score for obj in results], dtype=np.float32)
+        boxes = np.array([np.asarray(obj.bounding_box, dtype=np.float32).reshape(4) for obj in results],
+                         dtype=np.float32).reshape(-1, 4)
+        # relative to the input tensor -> relative to the image inside the padding
+        boxes *= np.tile(np.array(self.input_size, dtype=np.float32) / self.content_size, 2)
+        return label_ids, scores, boxes
+
+    def detect_regions(self, frame):
+        """One detector call per region, detections merged and mapped to frame pixels"""
+        region_results = []
+        for x1, y1, x2, y2 in self.regions.rects(frame.shape[1], frame.shape[0]):
+            region_results.append(self.detect_input(frame[y1:y2, x1:x2]))
+        batch = self.regions.merge(region_results)
+        return batch.select(np.argsort(-batch.scores, kind='stable')[:self.top_k])
+
+    def detect(self, frame):
+        """Detections of a BGR frame as new DetectedObject, bounding_box in frame pixels"""
+        if self.regions is not None:
+            batch = self.detect_regions(frame)
+            label_ids, scores = batch.label_ids, batch.scores
+            boxes = batch.boxes
+        else:
+            label_ids, scores, boxes = self.detect_input(frame)
+            boxes = boxes * np.array([frame.shape[1], frame.shape[0]] * 2, dtype=np.float32)
+        return [DetectedObject(int(label_id), float(score), box.reshape(2, 2))
+                for label_id, score, box in zip(label_ids, scores, boxes)]
+
+    def annotate(self, frame, results, annotate_summary=None):
+        return self.annotator.render(frame, self.annotator.record(results, annotate_summary))
+
+
+def run(engine, labels, camera_source=0, output_file='output.avi', show=True, min_confidence=0.20, top_k=5,
+        regions=None, gate=None, keep_aspect_ratio=True):
+    """
+    Camera (or video file) -> detection -> annotated window and video, until 'q' or the end of the input
+    gate -- optional DetectionGate, frames it skips keep the detections of the last detected frame
+    """
+    runner = DetectionRunner(engine, labels, min_confidence, top_k, regions, keep_aspect_ratio)
+    camera = cv2.VideoCapture(camera_source)
+    camera.set(3, IM_WIDTH)
+    camera.set(4, IM_HEIGHT)
+    fourcc = cv2.VideoWriter_fourcc(*'XVID')
+    out = None  # opened on the first frame, camera.set() is only a request and video files keep their size
+    results = []
+
+    try:
+        while camera.isOpened():
+            try:
+                start_ms = time.time()
+                ret, frame = camera.read()  # grab a frame from camera
+                if not ret:
+                    print('can NOT read from camera')
+                    break
+
+                start_tf_ms = time.time()
+                if gate is None or gate.should_detect(frame, start_tf_ms):
+                    results = runner.detect(frame)
+                elapsed_tf_ms = time.time() - start_tf_ms
+
+                if results:
+                    for obj in results:
+                        print("%s, %.0f%% %s %.2fms" % (labels.get(obj.label_id, obj.label_id), obj.score * 100,
+                                                       obj.bounding_box.astype(int).tolist(), elapsed_tf_ms * 1000))
+                    print('------')
+                else:
+                    print('No object detected')
+
+                # Print Frame rate info
+                elapsed_ms = time.time() - start_ms
+                annotate_text = "%.2f FPS, %.2fms total, %.2fms in tf " % (1.0 / elapsed_ms, elapsed_ms * 1000,
+                                                                          elapsed_tf_ms * 1000)
+                print('%s: %s' % (datetime.datetime.now(), annotate_text))
+                annotations = runner.annotator.record(results, annotate_text, start_ms)
+                if not output_file and not show:
+                    continue
+                runner.annotator.render(frame, annotations)
+                if output_file:
+                    if out is None:
+                        out = cv2.VideoWriter(output_file, fourcc, 20.0, (frame.shape[1], frame.shape[0]))
+                    out.write(frame)
+                if show:
+                    cv2.imshow('Detected Objects', frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+            except Exception:
+                # catch it and don't exit the while loop
+                print('In except')
+                traceback.print_exc()
+    finally:
+        print('In Finally')
+        if gate is not None:
+            gate.log_metrics()
+        camera.release()
+        if out is not None:
+            out.release()
+        cv2.destroyAllWindows()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Camera object detection with an EdgeTPU model")
+    parser.add_argument('--model', help='File path of Tflite model.', default='data/model_result/road_signs_quantized.tflite')
+    parser.add_argument('--label', help='File path of label file.', default='data/model_result/road_sign_labels.txt')
+    parser.add_argument('--video', help='Video file instead of the camera', default=None)
+    parser.add_argument('--output', help='Annotated output video', default='output.avi')
+    parser.add_argument('--no_show', help='Do not open a window', action='store_true')
+    parser.add_argument('--roi', help='Detect on the whole frame, a crop of the sign band or tiles of it',
+                        choices=['full', 'crop', 'tile'], default='full')
+    parser.add_argument('--gate', help='Run the detector only on scene changes', action='store_true')
+    parser.add_argument('--stretch', help='Stretch frames to the model input instead of padding them',
+                        action='store_true')
+    parser.add_argument('--replay', help='Use the replaying stand-in engine instead of an EdgeTPU', action='store_true')
+    args = parser.parse_args()
+
+    if args.replay:
+        from replay_detection_engine import ReplayDetectionEngine
+        engine = ReplayDetectionEngine()
+    else:
+        import edgetpu.detection.engine
+        engine = edgetpu.detection.engine.DetectionEngine(args.model)
+    regions = None
+    if args.roi != 'full':
+        _, height, width, _ = engine.get_input_tensor_shape()
+        regions = DetectionRegions(args.roi, tile_size=(int(width), int(height)))
+    run(engine, load_labels(args.label), args.video if args.video else 0, args.output, not args.no_show,
+        regions=regions, gate=DetectionGate() if args.gate else None, keep_aspect_ratio=not args.stretch)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -6,6 +6,13 @@ python generate_tfrecord.py --label=<LABEL> --csv_input=<PATH_TO_ANNOTATIONS_FOL
 
 # Create test data:
 python generate_tfrecord.py --label=<LABEL> --csv_input=<PATH_TO_ANNOTATIONS_FOLDER>/test_labels.csv  --output_path=<PATH_TO_ANNOTATIONS_FOLDER>/test.record  --label_map <PATH_TO_ANNOTATIONS_FOLDER>/label_map.pbtxt
+
+# Large image sets, written as 8 shards train.record-00000-of-00008 ... by 4 processes:
+python generate_tfrecord.py --csv_input=<PATH_TO_ANNOTATIONS_FOLDER>/train_labels.csv  --output_path=<PATH_TO_ANNOTATIONS_FOLDER>/train.record  --label_map <PATH_TO_ANNOTATIONS_FOLDER>/label_map.pbtxt --num_shards=8 --num_workers=4
+# and in the pipeline config: input_path: "<PATH_TO_ANNOTATIONS_FOLDER>/train.record-?????-of-00008"
+
+Image sizes come from the width/height columns of the CSV (written by xml_to_csv.py),
+or from the JPEG header when the CSV has none; images are never decoded.
 """
 
 from __future__ import division
@@ -13,16 +20,17 @@ from __future__ import print_function
 from __future__ import absolute_import
 
 import os
-import io
+import multiprocessing
 import pandas as pd
 import tensorflow as tf
 import sys
 
 sys.path.append("../../models/research")
 
-from PIL import Image
 from object_detection.utils import dataset_util
-from collections import namedtuple, OrderedDict
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from jpeg_header import jpeg_size
 
 flags = tf.app.flags
 flags.DEFINE_string("csv_input", "", "Path to the CSV input")
@@ -37,6 +45,8 @@ flags.DEFINE_string(
 # flags.DEFINE_string('label1', '', 'Name of class[1] label')
 # and so on.
 flags.DEFINE_string("img_path", "", "Path to images")
+flags.DEFINE_integer("num_shards", 1, "Number of output files, more than 1 adds a -00000-of-0000N suffix")
+flags.DEFINE_integer("num_workers", multiprocessing.cpu_count(), "Processes writing shards in parallel")
 FLAGS = flags.FLAGS
 
 
@@ -49,12 +59,18 @@ def split(df, group):
     ]
 
 
+def image_size(group, path):
+    """(width, height) from the CSV rows, or from the JPEG header if the CSV has no sizes"""
+    first = group.object.iloc[0]
+    if "width" in first and "height" in first and not pd.isnull(first["width"]) and not pd.isnull(first["height"]):
+        return int(first["width"]), int(first["height"])
+    return jpeg_size(os.path.join(path, group.filename))
+
+
 def create_tf_example(group, path, label_map):
     with tf.gfile.GFile(os.path.join(path, "{}".format(group.filename)), "rb") as fid:
         encoded_jpg = fid.read()
-    encoded_jpg_io = io.BytesIO(encoded_jpg)
-    image = Image.open(encoded_jpg_io)
-    width, height = image.size
+    width, height = image_size(group, path)
 
     filename = group.filename.encode("utf8")
     image_format = b"jpg"
@@ -103,15 +119,11 @@ def create_tf_example(group, path, label_map):
     return tf_example
 
 
-def main(_):
-    writer = tf.python_io.TFRecordWriter(FLAGS.output_path)
-    path = os.path.join(os.getcwd(), FLAGS.img_path)
-    examples = pd.read_csv(FLAGS.csv_input)
-
-    # Load the `label_map` from pbtxt file.
+def load_label_map(label_map_path):
+    """{class name: class id} from a `label_map.pbtxt`"""
     from object_detection.utils import label_map_util
 
-    label_map = label_map_util.load_labelmap(FLAGS.label_map)
+    label_map = label_map_util.load_labelmap(label_map_path)
     categories = label_map_util.convert_label_map_to_categories(
         label_map, max_num_classes=90, use_display_name=True
     )
@@ -119,15 +131,53 @@ def main(_):
     label_map = {}
     for k, v in category_index.items():
         label_map[v.get("name")] = v.get("id")
+    return label_map
+
+
+def shard_path(output_path, shard, num_shards):
+    if num_shards == 1:
+        return output_path
+    return "{}-{:05d}-of-{:05d}".format(output_path, shard, num_shards)
 
-    grouped = split(examples, "filename")
+
+def write_shard(csv_input, path, label_map, output_path, shard, num_shards):
+    """Every num_shards-th image of the CSV, starting at `shard`, into one record file"""
+    grouped = split(pd.read_csv(csv_input), "filename")[shard::num_shards]
+    writer = tf.python_io.TFRecordWriter(shard_path(output_path, shard, num_shards))
     for group in grouped:
         tf_example = create_tf_example(group, path, label_map)
         writer.write(tf_example.SerializeToString())
-
     writer.close()
-    output_path = os.path.join(os.getcwd(), FLAGS.output_path)
-    print("Successfully created the TFRecords: {}".format(output_path))
+    return len(grouped)
+
+
+def main(_):
+    path = os.path.join(os.getcwd(), FLAGS.img_path)
+    label_map = load_label_map(FLAGS.label_map)
+    num_shards = max(1, FLAGS.num_shards)
+
+    # each process builds and writes its own shards, csv and label map are small enough to pass around.
+    # spawn, not fork: TensorFlow is already imported here and its thread pools do not survive a fork
+    with ProcessPoolExecutor(
+        max_workers=min(num_shards, max(1, FLAGS.num_workers)),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        counts = list(
+            pool.map(
+                write_shard,
+                [FLAGS.csv_input] * num_shards,
+                [path] * num_shards,
+                [label_map] * num_shards,
+                [FLAGS.output_path] * num_shards,
+                range(num_shards),
+                [num_shards] * num_shards,
+            )
+        )
+
+    output_path = os.path.join(os.getcwd(), shard_path(FLAGS.output_path, 0, num_shards))
+    if num_shards > 1:
+        output_path = output_path.replace("-00000-of-", "-?????-of-")
+    print("Successfully created the TFRecords: {} ({} images)".format(output_path, sum(counts)))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+"""
+JPEG and PNG header probing without decoding the image
+
+Only the marker segments before the frame header (SOF) are read, EXIF and
+other APPn segments are skipped with seek, so probing costs a few hundred
+bytes of I/O instead of a full decode. PNG sizes come from the IHDR chunk.
+"""
+
+import struct
+
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_IEND = b"IEND"
+
+# SOF0..SOF15 carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range but are not frames
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# markers without a length field
+_STANDALONE_MARKERS = set(range(0xD0, 0xD8)) | {0x01}
+
+
+def jpeg_size(path):
+    """(width, height) from the JPEG frame header, raises ValueError for non-JPEG or truncated headers"""
+    with open(path, "rb") as f:
+        if f.read(2) != SOI:
+            raise ValueError("{} is not a JPEG file".format(path))
+        while True:
+            byte = f.read(1)
+            if not byte:
+                break
+            if byte != b"\xff":
+                continue
+            marker = f.read(1)
+            while marker == b"\xff":  # fill bytes
+                marker = f.read(1)
+            if not marker:
+                break
+            marker = ord(marker)
+            if marker in _STANDALONE_MARKERS:
+                continue
+            if marker == 0xD9 or marker == 0xDA:  # EOI or start of scan before any frame header
+                break
+            length = f.read(2)
+            if len(length) < 2:
+                break
+            (length,) = struct.unpack(">H", length)
+            if marker in _SOF_MARKERS:
+                header = f.read(5)
+                if len(header) < 5:
+                    break
+                _, height, width = struct.unpack(">BHH", header)
+                return width, height
+            f.seek(length - 2, 1)
+    raise ValueError("No JPEG frame header found in {}".format(path))
+
+
+def has_eoi(path):
+    """True if the file ends with the JPEG end-of-image marker (not truncated)"""
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        size = f.tell()
+        if size < 4:
+            return False
+        # some encoders pad after EOI, so look at the last few bytes
+        f.seek(max(0, size - 32))
+        return EOI in f.read()
+
+
+def png_size(path):
+    """(width, height) from the PNG IHDR chunk, raises ValueError for non-PNG files"""
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if len(header) < 24 or header[:8] != PNG_SIGNATURE or header[12:16] != b"IHDR":
+        raise ValueError("{} is not a PNG file".format(path))
+    return struct.unpack(">II", header[16:24])
+
+
+def image_size(path):
+    """(width, height) of a JPEG or PNG file"""
+    with open(path, "rb") as f:
+        signature = f.read(8)
+    if signature == PNG_SIGNATURE:
+        return png_size(path)
+    return jpeg_size(path)
+
+
+def is_complete(path):
+    """False if a JPEG or PNG file is cut off before its end marker"""
+    with open(path, "rb") as f:
+        signature = f.read(8)
+        if signature != PNG_SIGNATURE:
+            return has_eoi(path)
+        f.seek(0, 2)
+        f.seek(max(0, f.tell() - 12))
+        return PNG_IEND in f.read()
@@ -0,0 +1,223 @@
+"""
+Stand-in for edgetpu.detection.engine.DetectionEngine that replays labelImg boxes
+
+DetectWithImage recognizes which annotated image it was given (64-bit
+difference hash of driver/code image_hash.py, nearest match within a few bits) and returns the
+boxes of its XML file, scaled to the input size, after a simulated inference
+latency with jitter. Frames that match no annotated image return no objects.
+The detection -> control_car path can so be benchmarked and soak-tested on
+any machine, without an EdgeTPU.
+
+Usage:
+python replay_detection_engine.py                                   # soak test, 60 seconds
+python replay_detection_engine.py --seconds 600 --latency_ms 25 --jitter_ms 10
+"""
+
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from annotation_index import AnnotationIndex
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "driver", "code"))
+
+from detection_batch import DetectedObject
+from image_hash import dhash, hamming_distance
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+IMAGE_DIRS = [os.path.join(DATA_DIR, "images", name) for name in ("train", "test", "ver1")]
+LABEL_FILE = os.path.join(DATA_DIR, "model_result", "road_sign_labels.txt")
+_IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+
+
+def load_label_ids(label_file=LABEL_FILE):
+    """{label name: id} of a label file like road_sign_labels.txt ("0 Green", "3 Limit 25", ...)"""
+    with open(label_file, "r") as f:
+        pairs = (l.strip().split(maxsplit=1) for l in f.readlines() if l.strip())
+        return dict((v, int(k)) for k, v in pairs)
+
+
+def xml_class_to_label_id(class_name, label_ids):
+    """labelImg class names are longer than the label file names: "Speed Limit 25" -> "Limit 25" """
+    if class_name in label_ids:
+        return label_ids[class_name]
+    matches = [name for name in label_ids if name in class_name]
+    if not matches:
+        return None
+    return label_ids[max(matches, key=len)]
+
+
+class ReplayDetectionEngine(object):
+    def __init__(self, image_dirs=None, label_file=LABEL_FILE, latency_ms=20.0, jitter_ms=5.0, score=0.9,
+                 max_distance=6, seed=None, input_size=(300, 300)):
+        self.input_size = input_size  # (width, height) of the simulated model input tensor
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.score = score
+        self.max_distance = max_distance
+        self.rng = np.random.RandomState(seed)
+        self.label_ids = load_label_ids(label_file)
+
+        self.paths = []
+        self.sizes = []
+        self.boxes = []  # per image: (N, 4) x1, y1, x2, y2 in its own pixels
+        self.box_labels = []
+        skipped = set()
+        hashes = []
+        unreadable = []
+        for image_dir in image_dirs or IMAGE_DIRS:
+            per_file = {}
+            index = AnnotationIndex(image_dir)
+            try:
+                index.update()
+                for filename, width, height, class_name, xmin, ymin, xmax, ymax in index.rows():
+                    label_id = xml_class_to_label_id(class_name, self.label_ids)
+                    if label_id is None:
+                        skipped.add(class_name)
+                        continue
+                    per_file.setdefault(filename, []).append((label_id, xmin, ymin, xmax, ymax))
+            finally:
+                index.close()
+            paths = sorted(p for pattern in _IMAGE_PATTERNS for p in glob.glob(os.path.join(image_dir, pattern)))
+            for path in paths:
+                image = cv2.imread(path)
+                if image is None:
+                    unreadable.append(path)
+                    continue
+                rows = per_file.get(os.path.basename(path), [])
+                self.paths.append(path)
+                self.sizes.append(image.shape[1::-1])
+                hashes.append(dhash(image))
+                self.box_labels.append(np.array([r[0] for r in rows], dtype=np.int32))
+                self.boxes.append(np.array([r[1:] for r in rows], dtype=np.float32).reshape(-1, 4))
+        if skipped:
+            logging.warning("Classes not in %s, ignored: %s" % (label_file, sorted(skipped)))
+        if unreadable:
+            logging.warning("Missing or corrupt images, ignored: %s" % unreadable)
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        logging.info("ReplayDetectionEngine: %d annotated images, %d boxes"
+                     % (len(self.paths), sum(len(b) for b in self.boxes)))
+
+    def match(self, rgb_image):
+        """Index of the annotated image the input shows, or None"""
+        if len(self.hashes) == 0:
+            return None
+        bgr_image = cv2.cvtColor(np.ascontiguousarray(rgb_image), cv2.COLOR_RGB2BGR)
+        distances = hamming_distance(dhash(bgr_image), self.hashes)
+        best = int(np.argmin(distances))
+        return best if distances[best] <= self.max_distance else None
+
+    def simulate_latency(self):
+        delay_ms = max(0.0, self.rng.normal(self.latency_ms, self.jitter_ms)) if self.jitter_ms else self.latency_ms
+        time.sleep(delay_ms / 1000.0)
+
+    def DetectWithImage(self, img, threshold=0.1, keep_aspect_ratio=False, relative_coord=True, top_k=3,
+                        resample=None):
+        """Same signature as the EdgeTPU DetectionEngine; img is a PIL image or an RGB numpy array"""
+        rgb_image = np.asarray(img)
+        self.simulate_latency()
+        i = self.match(rgb_image)
+        if i is None or self.score < threshold:
+            return []
+        height, width = rgb_image.shape[:2]
+        scale = np.array([width, height, width, height], dtype=np.float32) / np.tile(self.sizes[i], 2)
+        boxes = self.boxes[i] * scale
+        if relative_coord:
+            boxes = boxes / np.array([width, height, width, height], dtype=np.float32)
+        results = []
+        for label_id, box in zip(self.box_labels[i][:top_k], boxes[:top_k]):
+            results.append(DetectedObject(int(label_id), self.score, box.reshape(2, 2)))
+        return results
+
+    def get_input_tensor_shape(self):
+        return np.array([1, self.input_size[1], self.input_size[0], 3])
+
+    def DetectWithInputTensor(self, input_tensor, threshold=0.1, top_k=3):
+        """Flat uint8 RGB input of get_input_tensor_shape(), boxes relative like the EdgeTPU engine"""
+        rgb_image = np.asarray(input_tensor, dtype=np.uint8).reshape(self.input_size[1], self.input_size[0], 3)
+        # a letterboxed input is padded with black at the bottom or right, match the image inside it
+        filled = rgb_image.any(axis=2)
+        rows, cols = np.flatnonzero(filled.any(axis=1)), np.flatnonzero(filled.any(axis=0))
+        if len(rows) == 0:
+            return []
+        height, width = rows[-1] + 1, cols[-1] + 1
+        results = self.DetectWithImage(rgb_image[:height, :width], threshold=threshold, relative_coord=False,
+                                       top_k=top_k)
+        scale = np.array([self.input_size[0], self.input_size[1]], dtype=np.float32)
+        for obj in results:
+            obj.bounding_box = obj.bounding_box / scale
+        return results
+
+    def frames(self, size=(640, 480)):
+        """Annotated images in order, BGR and resized like camera frames, for replaying a drive"""
+        for path in self.paths:
+            image = cv2.imread(path)
+            if image is None:
+                logging.warning("Image %s can no longer be read, skipped" % path)
+                continue
+            yield path, cv2.resize(image, size)
+
+
+def soak_test(engine, seconds=60.0, width=640, height=480):
+    """Detection -> ObjectsOnRoadProcessorWindows.control_car over the annotated images, for `seconds`"""
+    from objects_on_road_processor_test_windows import ObjectsOnRoadProcessorWindows
+
+    processor = ObjectsOnRoadProcessorWindows(width=width, height=height)
+    frames = list(engine.frames((width, height)))
+    detect_ms = []
+    control_ms = []
+    matched = 0
+    errors = 0
+    speed_changes = 0
+    start_time = time.time()
+    while time.time() - start_time < seconds:
+        for path, frame in frames:
+            if time.time() - start_time >= seconds:
+                break
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            start_ms = time.time()
+            objects = engine.DetectWithImage(rgb, threshold=processor.min_confidence, relative_coord=False, top_k=5)
+            detected_ms = time.time()
+            old_speed = processor.speed
+            try:
+                processor.control_car(objects)
+            except Exception:
+                errors += 1
+                logging.exception("control_car failed on %s" % path)
+            control_ms.append((time.time() - detected_ms) * 1000)
+            detect_ms.append((detected_ms - start_ms) * 1000)
+            matched += engine.match(rgb) is not None
+            speed_changes += processor.speed != old_speed
+
+    detect_ms = np.asarray(detect_ms)
+    control_ms = np.asarray(control_ms)
+    print("%d frames in %.0fs, %d matched an annotation, %d speed changes, %d errors"
+          % (len(detect_ms), time.time() - start_time, matched, speed_changes, errors))
+    print("detect:      p50 %.1f ms, p99 %.1f ms" % (np.percentile(detect_ms, 50), np.percentile(detect_ms, 99)))
+    print("control_car: p50 %.3f ms, p99 %.3f ms" % (np.percentile(control_ms, 50), np.percentile(control_ms, 99)))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test with the replaying stand-in detection engine")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--latency_ms", help="Mean simulated inference time", type=float, default=20.0)
+    parser.add_argument("--jitter_ms", help="Std deviation of the inference time", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    engine = ReplayDetectionEngine(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=args.seed)
+    logging.getLogger().setLevel(logging.WARNING)  # control_car logs every speed change
+    if soak_test(engine, args.seconds):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,136 @@
+"""
+Resize and re-encode training images before generate_tfrecord.py
+
+The SSD models resize every image to 300x300 on each training step, so the
+full resolution camera JPEGs only make the records bigger and slower to decode.
+Images of a CSV from xml_to_csv.py are resized in parallel into a new folder,
+and the boxes and sizes of the CSV are rescaled to match.
+
+Usage:
+python resize_images.py -i [PATH_TO_IMAGES_FOLDER]/train -c [PATH_TO_ANNOTATIONS_FOLDER]/train_labels.csv -o [PATH_TO_IMAGES_FOLDER]/train_300
+
+# then create the records from the resized images:
+python generate_tfrecord.py --csv_input=[PATH_TO_IMAGES_FOLDER]/train_300/train_labels.csv --img_path=[PATH_TO_IMAGES_FOLDER]/train_300 ...
+"""
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import pandas as pd
+
+
+def _decode_time(data, repeat=3):
+    start_time = time.time()
+    for _ in range(repeat):
+        cv2.imdecode(data, cv2.IMREAD_COLOR)
+    return (time.time() - start_time) / repeat
+
+
+def resize_image(input_path, output_path, size, quality):
+    """Resize one image to size (width, height), returns its stats before and after"""
+    cv2.setNumThreads(1)  # parallelism comes from the worker processes
+    data = np.fromfile(input_path, dtype=np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode {}".format(input_path))
+    height, width = image.shape[:2]
+    interpolation = cv2.INTER_AREA if size[0] < width else cv2.INTER_LINEAR
+    resized = cv2.resize(image, size, interpolation=interpolation)
+    _, encoded = cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    encoded.tofile(output_path)
+    return {
+        "width": width,
+        "height": height,
+        "bytes_before": len(data),
+        "bytes_after": len(encoded),
+        "decode_before": _decode_time(data),
+        "decode_after": _decode_time(encoded),
+    }
+
+
+def rescale_boxes(df, sizes, size):
+    """Boxes and sizes of the CSV rows scaled from the original image sizes to `size`"""
+    df = df.copy()
+    original = np.array([sizes[filename] for filename in df["filename"]], dtype=np.float64)
+    scale_x = size[0] / original[:, 0]
+    scale_y = size[1] / original[:, 1]
+    xmin = np.clip(np.round(df["xmin"].values * scale_x), 0, size[0] - 1)
+    ymin = np.clip(np.round(df["ymin"].values * scale_y), 0, size[1] - 1)
+    df["xmin"] = xmin.astype(int)
+    df["ymin"] = ymin.astype(int)
+    # keep boxes at least one pixel wide after rounding
+    df["xmax"] = np.clip(np.maximum(np.round(df["xmax"].values * scale_x), xmin + 1), 0, size[0]).astype(int)
+    df["ymax"] = np.clip(np.maximum(np.round(df["ymax"].values * scale_y), ymin + 1), 0, size[1]).astype(int)
+    df["width"] = size[0]
+    df["height"] = size[1]
+    return df
+
+
+def resize_dataset(input_dir, csv_input, output_dir, size=(300, 300), quality=90, csv_output=None, workers=None):
+    os.makedirs(output_dir, exist_ok=True)
+    df = pd.read_csv(csv_input)
+    filenames = sorted(df["filename"].unique())
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(
+            pool.map(
+                resize_image,
+                [os.path.join(input_dir, f) for f in filenames],
+                [os.path.join(output_dir, os.path.splitext(f)[0] + ".jpg") for f in filenames],
+                [size] * len(filenames),
+                [quality] * len(filenames),
+            )
+        )
+    stats = dict(zip(filenames, results))
+
+    df = rescale_boxes(df, dict((f, (s["width"], s["height"])) for f, s in stats.items()), size)
+    df["filename"] = [os.path.splitext(f)[0] + ".jpg" for f in df["filename"]]
+    csv_output = csv_output or os.path.join(output_dir, os.path.basename(csv_input))
+    df.to_csv(csv_output, index=None)
+    logging.info("Rescaled labels written to %s" % csv_output)
+    return stats
+
+
+def print_report(stats):
+    count = len(stats)
+    bytes_before = sum(s["bytes_before"] for s in stats.values())
+    bytes_after = sum(s["bytes_after"] for s in stats.values())
+    decode_before = sum(s["decode_before"] for s in stats.values())
+    decode_after = sum(s["decode_after"] for s in stats.values())
+    print("%d images resized" % count)
+    print(
+        "size:   %.1f MB -> %.1f MB, %.1f MB saved (%.0f%%)"
+        % (bytes_before / 1e6, bytes_after / 1e6, (bytes_before - bytes_after) / 1e6,
+           100.0 * (bytes_before - bytes_after) / max(1, bytes_before))
+    )
+    print(
+        "decode: %.2f ms -> %.2f ms per image, %.0f%% saved"
+        % (1000.0 * decode_before / max(1, count), 1000.0 * decode_after / max(1, count),
+           100.0 * (decode_before - decode_after) / max(1e-9, decode_before))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resize and re-encode images of a labels CSV")
+    parser.add_argument("-i", "--inputDir", help="Folder with the original images", type=str, required=True)
+    parser.add_argument("-c", "--csvInput", help="Labels CSV written by xml_to_csv.py", type=str, required=True)
+    parser.add_argument("-o", "--outputDir", help="Folder for the resized images and CSV", type=str, required=True)
+    parser.add_argument("--csvOutput", help="Rescaled labels CSV (default: in outputDir)", type=str, default=None)
+    parser.add_argument("--width", type=int, default=300)
+    parser.add_argument("--height", type=int, default=300)
+    parser.add_argument("--quality", help="JPEG quality", type=int, default=90)
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    stats = resize_dataset(args.inputDir, args.csvInput, args.outputDir, (args.width, args.height), args.quality,
+                           args.csvOutput, args.workers)
+    print_report(stats)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
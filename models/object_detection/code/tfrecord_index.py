@@ -0,0 +1,232 @@
+"""
+Byte-offset index and random access reader for TFRecord files, without TensorFlow
+
+A TFRecord file is a sequence of
+    uint64 length | uint32 masked crc32c(length) | data | uint32 masked crc32c(data)
+The index (<record>.idx, written next to the record file) stores the offset and
+length of every record, so example N is read from a memory map in O(1) and
+decoded with a small protobuf parser for tf.train.Example.
+
+Only uncompressed records are supported (generate_tfrecord.py writes those).
+
+Usage:
+python tfrecord_index.py build <PATH_TO_ANNOTATIONS_FOLDER>/train.record-*
+python tfrecord_index.py show <PATH_TO_ANNOTATIONS_FOLDER>/train.record 12
+"""
+
+import argparse
+import glob
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+
+INDEX_SUFFIX = ".idx"
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u8")])
+
+
+def _crc32c_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC32C_TABLE = _crc32c_table()
+
+
+def masked_crc32c(data):
+    crc = 0xFFFFFFFF
+    for byte in bytearray(data):
+        crc = _CRC32C_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    crc ^= 0xFFFFFFFF
+    return (((crc >> 15) | (crc << 17)) + 0xA282EAD8) & 0xFFFFFFFF
+
+
+def build_index(record_path, index_path=None):
+    """Scan the record headers once and write the offsets, returns the index array"""
+    index_path = index_path or record_path + INDEX_SUFFIX
+    entries = []
+    size = os.path.getsize(record_path)
+    with open(record_path, "rb") as f:
+        offset = 0
+        while offset < size:
+            header = f.read(12)
+            if len(header) < 12:
+                raise ValueError("{}: truncated record header at byte {}".format(record_path, offset))
+            length, length_crc = struct.unpack("<QI", header)
+            if masked_crc32c(header[:8]) != length_crc:
+                raise ValueError("{}: corrupt record length at byte {}".format(record_path, offset))
+            if offset + 12 + length + 4 > size:
+                raise ValueError("{}: truncated record at byte {}".format(record_path, offset))
+            entries.append((offset + 12, length))
+            f.seek(length + 4, 1)
+            offset += 12 + length + 4
+    index = np.array(entries, dtype=INDEX_DTYPE)
+    index.tofile(index_path)
+    logging.info("Indexed %d records of %s" % (len(index), record_path))
+    return index
+
+
+def _read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(buf):
+    """(field number, wire type, value) of a serialized message; value is an int or a memoryview"""
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == 1:
+            value, pos = buf[pos:pos + 8], pos + 8
+        elif wire_type == 2:
+            length, pos = _read_varint(buf, pos)
+            value, pos = buf[pos:pos + length], pos + length
+        elif wire_type == 5:
+            value, pos = buf[pos:pos + 4], pos + 4
+        else:
+            raise ValueError("Unsupported protobuf wire type {}".format(wire_type))
+        yield field, wire_type, value
+
+
+def _signed64(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _parse_feature(buf):
+    # Feature: oneof bytes_list = 1, float_list = 2, int64_list = 3; each list has `repeated value = 1`
+    for kind, _, value_list in _fields(buf):
+        values = []
+        for _, wire_type, value in _fields(value_list):
+            if kind == 1:
+                values.append(bytes(value))
+            elif kind == 2:
+                values.extend(np.frombuffer(value, dtype="<f4").tolist())  # packed (2) or single (5)
+            elif kind == 3:
+                if wire_type == 2:  # packed
+                    pos = 0
+                    while pos < len(value):
+                        v, pos = _read_varint(value, pos)
+                        values.append(_signed64(v))
+                else:
+                    values.append(_signed64(value))
+        return values
+    return []
+
+
+def parse_example(data):
+    """tf.train.Example bytes as {feature name: list of values}"""
+    features = {}
+    buf = memoryview(data)
+    for field, _, features_buf in _fields(buf):
+        if field != 1:  # Example.features
+            continue
+        for entry_field, _, entry in _fields(features_buf):
+            if entry_field != 1:  # Features.feature map entries
+                continue
+            key, value = None, b""
+            for f, _, v in _fields(entry):
+                if f == 1:
+                    key = bytes(v).decode("utf8")
+                elif f == 2:
+                    value = v
+            features[key] = _parse_feature(value)
+    return features
+
+
+class IndexedTFRecord(object):
+    """Random access to the records of one memory-mapped TFRecord file"""
+
+    def __init__(self, record_path, index_path=None):
+        self.record_path = record_path
+        index_path = index_path or record_path + INDEX_SUFFIX
+        if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(record_path):
+            self.index = build_index(record_path, index_path)
+        else:
+            self.index = np.fromfile(index_path, dtype=INDEX_DTYPE)
+        self.file = open(record_path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if len(self.index) else b""
+
+    def __len__(self):
+        return len(self.index)
+
+    def raw(self, i):
+        """Serialized bytes of record i"""
+        offset, length = int(self.index[i]["offset"]), int(self.index[i]["length"])
+        return self.data[offset:offset + length]
+
+    def __getitem__(self, i):
+        return parse_example(self.raw(i))
+
+    def sample(self, count, seed=None):
+        """`count` distinct random examples, without reading the rest of the file"""
+        picks = np.random.RandomState(seed).choice(len(self), min(count, len(self)), replace=False)
+        return [self[int(i)] for i in picks]
+
+    def close(self):
+        if len(self.index):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, _type, value, traceback):
+        self.close()
+
+
+def _describe(features):
+    lines = []
+    for name in sorted(features):
+        values = features[name]
+        if name == "image/encoded":
+            lines.append("  {}: <{} bytes>".format(name, sum(len(v) for v in values)))
+        else:
+            lines.append("  {}: {}".format(name, values))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index and inspect TFRecord files without TensorFlow")
+    subparsers = parser.add_subparsers(dest="command")
+    build_parser = subparsers.add_parser("build", help="Write <record>.idx for record files")
+    build_parser.add_argument("records", nargs="+", help="TFRecord files or glob patterns")
+    show_parser = subparsers.add_parser("show", help="Print one example")
+    show_parser.add_argument("record")
+    show_parser.add_argument("index", type=int)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        total = 0
+        for pattern in args.records:
+            for path in sorted(glob.glob(pattern)) or [pattern]:
+                total += len(build_index(path))
+        print("{} records indexed".format(total))
+    elif args.command == "show":
+        with IndexedTFRecord(args.record) as records:
+            print("{} [{} of {}]".format(args.record, args.index, len(records)))
+            print(_describe(records[args.index]))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,171 @@
+"""
+Dataset integrity check to run before generate_tfrecord.py
+
+Images are checked on a process pool (JPEG/PNG header readable, not truncated,
+size matches the annotation), then all boxes are checked at once with NumPy:
+outside the image, zero or negative area, class missing from label_map.pbtxt.
+
+Annotations come from the labelImg XML files of the image folders (through the
+annotation index, see annotation_index.py) or from a CSV written by xml_to_csv.py.
+
+Usage:
+python validate_dataset.py -i [PATH_TO_IMAGES_FOLDER]/train [PATH_TO_IMAGES_FOLDER]/test -l [PATH_TO_ANNOTATIONS_FOLDER]/label_map.pbtxt
+python validate_dataset.py -i [PATH_TO_IMAGES_FOLDER]/train -c [PATH_TO_ANNOTATIONS_FOLDER]/train_labels.csv --decode
+"""
+
+import argparse
+import logging
+import os
+import re
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from annotation_index import AnnotationIndex
+from jpeg_header import image_size, is_complete
+
+_COLUMNS = ["filename", "width", "height", "class", "xmin", "ymin", "xmax", "ymax"]
+_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+_CHECK_CHUNK = 64
+_MAX_LISTED = 10
+
+
+def read_label_map(label_map_path):
+    """{class name: id} from a label_map.pbtxt, without the object_detection API"""
+    with open(label_map_path, "r") as f:
+        content = f.read()
+    label_map = {}
+    for item in re.findall(r"item\s*\{(.*?)\}", content, re.S):
+        name = re.search(r"(?:display_name|name)\s*:\s*['\"](.*?)['\"]", item)
+        item_id = re.search(r"\bid\s*:\s*(\d+)", item)
+        if name and item_id:
+            label_map[name.group(1)] = int(item_id.group(1))
+    return label_map
+
+
+def check_image(path, decode=False):
+    """(width, height, problem) of one image, problem is None if the image is fine"""
+    if not os.path.exists(path):
+        return 0, 0, "image missing"
+    try:
+        width, height = image_size(path)
+    except ValueError:
+        return 0, 0, "image not a readable JPEG or PNG"
+    if not is_complete(path):
+        return width, height, "image truncated (no end marker)"
+    if decode and cv2.imread(path) is None:
+        return width, height, "image cannot be decoded"
+    return width, height, None
+
+
+def _check_images(paths, decode):
+    cv2.setNumThreads(1)
+    return [check_image(path, decode) for path in paths]
+
+
+def load_annotations(image_dirs, csv_input=None, workers=None):
+    """Boxes as a DataFrame with xml_to_csv columns plus the image folder"""
+    frames = []
+    for image_dir in image_dirs:
+        if csv_input:
+            df = pd.read_csv(csv_input)
+        else:
+            index = AnnotationIndex(image_dir)
+            try:
+                index.update(workers)
+                df = pd.DataFrame(index.rows(), columns=_COLUMNS)
+            finally:
+                index.close()
+        df["dir"] = image_dir
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=_COLUMNS + ["dir"])
+
+
+def validate(image_dirs, label_map=None, csv_input=None, decode=False, workers=None):
+    """OrderedDict {problem: list of offending images or boxes}"""
+    boxes = load_annotations(image_dirs, csv_input, workers)
+    problems = OrderedDict()
+
+    # images: every annotated image plus every image file in the folders
+    paths = set(os.path.join(d, f) for d, f in zip(boxes["dir"], boxes["filename"]))
+    unannotated = []
+    for image_dir in image_dirs:
+        for name in sorted(os.listdir(image_dir)):
+            path = os.path.join(image_dir, name)
+            if name.lower().endswith(_IMAGE_EXTENSIONS) and path not in paths:
+                unannotated.append(path)
+    paths = sorted(paths) + unannotated
+    chunks = [paths[i:i + _CHECK_CHUNK] for i in range(0, len(paths), _CHECK_CHUNK)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = [r for chunk in pool.map(_check_images, chunks, [decode] * len(chunks)) for r in chunk]
+    sizes = {}
+    for path, (width, height, problem) in zip(paths, results):
+        sizes[path] = (width, height)
+        if problem:
+            problems.setdefault(problem, []).append(path)
+    problems["image without annotations"] = unannotated
+
+    # boxes, all at once
+    if len(boxes):
+        image_paths = [os.path.join(d, f) for d, f in zip(boxes["dir"], boxes["filename"])]
+        actual = np.array([sizes[p] for p in image_paths], dtype=np.int64)
+        width = boxes["width"].values.astype(np.int64)
+        height = boxes["height"].values.astype(np.int64)
+        xmin, ymin = boxes["xmin"].values, boxes["ymin"].values
+        xmax, ymax = boxes["xmax"].values, boxes["ymax"].values
+        readable = actual[:, 0] > 0
+        checks = OrderedDict([
+            ("annotation size differs from image", readable & ((width != actual[:, 0]) | (height != actual[:, 1]))),
+            ("box outside image", (xmin < 0) | (ymin < 0) | (xmax > width) | (ymax > height)),
+            ("box with zero or negative area", (xmax <= xmin) | (ymax <= ymin)),
+        ])
+        if label_map is not None:
+            checks["class missing from label map"] = ~boxes["class"].isin(list(label_map)).values
+        for problem, mask in checks.items():
+            problems[problem] = [
+                "{} {} [{}, {}, {}, {}] in {}x{}".format(image_paths[i], boxes["class"].iloc[i], xmin[i], ymin[i],
+                                                         xmax[i], ymax[i], width[i], height[i])
+                for i in np.flatnonzero(mask)
+            ]
+    logging.info("Checked %d images and %d boxes" % (len(paths), len(boxes)))
+    return problems
+
+
+def print_report(problems):
+    errors = 0
+    for problem, items in problems.items():
+        print("%-40s %d" % (problem, len(items)))
+        for item in items[:_MAX_LISTED]:
+            print("    " + item)
+        if len(items) > _MAX_LISTED:
+            print("    ... %d more" % (len(items) - _MAX_LISTED))
+        if problem != "image without annotations":
+            errors += len(items)
+    print("Dataset is valid." if errors == 0 else "%d problems found." % errors)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check images and box annotations before record generation")
+    parser.add_argument("-i", "--inputDirs", nargs="+", help="Image folders with labelImg .xml files", required=True)
+    parser.add_argument("-c", "--csvInput", help="Use a labels CSV instead of the .xml files", type=str, default=None)
+    parser.add_argument("-l", "--labelMap", help="label_map.pbtxt to check the classes against", type=str, default=None)
+    parser.add_argument("--decode", help="Also decode every image", action="store_true")
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.csvInput and len(args.inputDirs) > 1:
+        parser.error("a CSV goes with a single image folder")
+    label_map = read_label_map(args.labelMap) if args.labelMap else None
+    problems = validate(args.inputDirs, label_map, args.csvInput, args.decode, args.workers)
+    if print_report(problems):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -5,45 +5,42 @@ python xml_to_csv.py -i [PATH_TO_IMAGES_FOLDER]/train -o [PATH_TO_ANNOTATIONS_FO
 
 # Create test data:
 python xml_to_csv.py -i [PATH_TO_IMAGES_FOLDER]/test -o [PATH_TO_ANNOTATIONS_FOLDER]/test_labels.csv
+
+Parsed annotations are cached in [PATH_TO_IMAGES_FOLDER]/train/.annotation_index.sqlite,
+so later runs only parse the .xml files that changed.
 """
 
 import os
-import glob
 import pandas as pd
 import argparse
-import xml.etree.ElementTree as ET
+
+from annotation_index import AnnotationIndex
 
 
-def xml_to_csv(path):
+def xml_to_csv(path, index_file=None, workers=None):
     """Iterates through all .xml files (generated by labelImg) in a given directory and combines them in a single Pandas datagrame.
 
     Parameters:
     ----------
     path : {str}
         The path containing the .xml files
+    index_file : {str}
+        SQLite annotation index, only new or changed .xml files are parsed again.
+        Defaults to `.annotation_index.sqlite` in `path`
+    workers : {int}
+        Processes used when many .xml files changed
     Returns
     -------
     Pandas DataFrame
         The produced dataframe
     """
-    classes_names = []
-    xml_list = []
-    for xml_file in glob.glob(path + "/*.xml"):
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        for member in root.findall("object"):
-            classes_names.append(member[0].text)
-            value = (
-                root.find("filename").text,
-                int(root.find("size")[0].text),
-                int(root.find("size")[1].text),
-                member[0].text,
-                int(member[4][0].text),
-                int(member[4][1].text),
-                int(member[4][2].text),
-                int(member[4][3].text),
-            )
-            xml_list.append(value)
+    index = AnnotationIndex(path, index_file)
+    try:
+        index.update(workers)
+        xml_list = index.rows()
+        classes_names = index.class_names()
+    finally:
+        index.close()
     column_name = [
         "filename",
         "width",
@@ -55,8 +52,6 @@ def xml_to_csv(path):
         "ymax",
     ]
     xml_df = pd.DataFrame(xml_list, columns=column_name)
-    classes_names = list(set(classes_names))
-    classes_names.sort()
     return xml_df, classes_names
 
 
@@ -82,6 +77,15 @@ def main():
         type=str,
         default="",
     )
+    parser.add_argument(
+        "--indexFile",
+        help="SQLite annotation index (default: .annotation_index.sqlite in the input folder)",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "-w", "--workers", help="Processes used to parse changed .xml files", type=int, default=None
+    )
 
     args = parser.parse_args()
 
@@ -92,7 +96,7 @@ def main():
 
     assert os.path.isdir(args.inputDir)
     os.makedirs(os.path.dirname(args.outputFile), exist_ok=True)
-    xml_df, classes_names = xml_to_csv(args.inputDir)
+    xml_df, classes_names = xml_to_csv(args.inputDir, args.indexFile, args.workers)
     xml_df.to_csv(args.outputFile, index=None)
     print("Successfully converted xml to csv.")
     if args.labelMapDir: